@@ -0,0 +1,71 @@
+# Resident memory against page count while reading a synthetic .bz2 dump with
+# dump_reader.read_dump():
+#   python3 bench/dump_memory.py [<no. of pages, default 50000>] [keep]
+# With "keep" every page is also held in a list, as the handler used to do, to
+# compare against. Needs bzcat, like read_dump().
+import os
+import bz2
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dump_reader import read_dump
+
+PAGE = """  <page>
+    <title>Synthetic page {i}</title>
+    <ns>0</ns>
+    <id>{i}</id>
+    <revision>
+      <id>{rev}</id>
+      <timestamp>2021-01-01T00:00:00Z</timestamp>
+      <contributor><username>U{i}</username><id>{i}</id></contributor>
+      <text bytes="{size}" xml:space="preserve">{text}</text>
+    </revision>
+  </page>
+"""
+
+
+def write_dump(path, pages, page_chars=6000):
+    body = ("Some text of the page with a [[link]] and a reference.&lt;ref&gt;[http://example.com/x x]"
+            "&lt;/ref&gt;\n== Section ==\n")
+    text = (body * (page_chars // len(body) + 1))[:page_chars]
+    with bz2.open(path, 'wt', encoding='utf-8') as dump:
+        dump.write('<mediawiki>\n  <siteinfo><sitename>Wikipedia</sitename></siteinfo>\n')
+        for i in range(pages):
+            dump.write(PAGE.format(i=i, rev=1000000 + i, size=len(text), text=text))
+        dump.write('</mediawiki>\n')
+
+
+def rss_mb():
+    # current (not peak) resident set size
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    keep = len(sys.argv) > 2 and sys.argv[2] == 'keep'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.xml.bz2')
+        print(f"Writing a synthetic dump of {pages} pages...")
+        write_dump(path, pages)
+        print(f"dump: {os.path.getsize(path) / (1 << 20):.1f} MB compressed")
+
+        kept = []
+        start = time.perf_counter()
+        print(f"{'pages':>8} {'rss MB':>8}")
+        print(f"{0:8} {rss_mb():8.1f}")
+        for n, page in enumerate(read_dump(path), 1):
+            if keep:
+                kept.append(page)
+            if n % (pages // 10 or 1) == 0:
+                print(f"{n:8} {rss_mb():8.1f}")
+
+        print(f"{n} pages in {time.perf_counter() - start:.1f}s ({'kept' if keep else 'streamed'})")
+
+
+if __name__ == '__main__':
+    main()
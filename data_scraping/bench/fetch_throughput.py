@@ -0,0 +1,116 @@
+# Reference fetching throughput against a local stand-in server, offline:
+#   python3 bench/fetch_throughput.py [<pages, default 10>] [<connections, default 15>] [<latency ms, default 50>]
+# Every page has 4 sections of 10 references, spread over 8 local "hosts"
+# (127.0.0.1-8) that answer html after the given latency. The Fetcher gets
+# each page's references in one scrape_many() call; the old way is a thread
+# pool per section, with three plain requests.get() per url (status, content
+# type, body) and BeautifulSoup.
+import os
+import re
+import sys
+import time
+import asyncio
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from aiohttp import web
+from bs4 import BeautifulSoup
+from multiprocessing.dummy import Pool as Threadpool
+
+from fetcher import Fetcher
+
+PORT = 8779
+SECTIONS = 4
+LINKS = 10
+HOSTS = 8
+
+HTML = ('<html><head><title>Reference</title></head><body>'
+        + '<p>Paragraph of the reference with some text in it, long enough to be kept.</p>' * 200
+        + '</body></html>')
+
+
+def serve(latency, ready):
+    async def page(request):
+        await asyncio.sleep(latency)
+        return web.Response(text=HTML, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{name:.*}', page)
+
+    async def start():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        # 0.0.0.0 answers on every loopback address
+        await web.TCPSite(runner, '0.0.0.0', PORT, backlog=1024).start()
+        ready.set()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(start())
+    loop.run_forever()
+
+
+def page_links(pages):
+    for p in range(pages):
+        yield [[f'http://127.0.0.{(p + s * LINKS + l) % HOSTS + 1}:{PORT}/{p}/{s}/{l}' for l in range(LINKS)]
+               for s in range(SECTIONS)]
+
+
+def old_scrape_text(url):
+    # main.scrape_text() before the Fetcher, for html references
+    scraped_text = ""
+    try:
+        r = requests.get(url, timeout=5).status_code
+        if int(r) == 200:
+            content_type = requests.get(url).headers.get('content-type')
+            if 'text/html' in content_type:
+                soup = BeautifulSoup(requests.get(url, timeout=3).content, "html.parser")
+                scraped_text = ' '.join(data.get_text() for data in soup.find_all(['p', 'article', 'span']))[:10000]
+            scraped_text = re.sub(r'\s\s+', ' ', scraped_text.replace('\n', ' '))
+    except Exception:
+        pass
+    return scraped_text
+
+
+def run_old(pages, connections):
+    texts = 0
+    for sections in page_links(pages):
+        for links in sections:
+            threadpool = Threadpool(processes=connections)
+            texts += sum(bool(text) for text in threadpool.map(old_scrape_text, links))
+            threadpool.close()
+    return texts
+
+
+def run_new(pages, connections):
+    texts = 0
+    with Fetcher(max_connections=connections) as fetcher:
+        for sections in page_links(pages):
+            texts += sum(bool(text) for refs in fetcher.scrape_many(sections) for text in refs)
+    return texts
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    latency = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(latency, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    urls = pages * SECTIONS * LINKS
+    try:
+        for name, run in [('Fetcher', run_new), ('old', run_old)]:
+            start = time.perf_counter()
+            texts = run(pages, connections)
+            took = time.perf_counter() - start
+            print(f"{name:8} {urls} urls in {took:6.2f}s  {urls / took:7.1f} urls/s  ({texts} texts)")
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
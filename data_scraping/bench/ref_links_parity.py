@@ -0,0 +1,97 @@
+# Checks link_extraction.ref_links() against the BeautifulSoup + mwparserfromhell
+# extractor it replaced, and times both:
+#   python3 bench/ref_links_parity.py [<domain-wise xml file>]
+# Without a file, synthetic sections covering the kinds of refs found in the
+# dumps are used. The only expected difference is that the old extractor
+# escaped '&' to '&amp;' in urls.
+import os
+import re
+import sys
+import time
+import random
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mwparserfromhell
+from bs4 import BeautifulSoup
+
+from link_extraction import ref_links
+from dump_reader import read_domain_pages
+from extract_sections import section_extraction
+
+
+def old_ref_links(section_text):
+    # link_extraction.ref_links() before the single scan
+    soup = BeautifulSoup(str(section_text))
+    s = list(soup.findAll("ref"))
+    s = [str(x) for x in s]
+    finallist = []
+    for i in s:
+        wikicode = mwparserfromhell.parse(i)
+        listoflinks = list(wikicode.filter_external_links())
+        for i in listoflinks:
+            try:
+                finallist.append(re.findall(r'(https?://[^\s]+)', str(i))[0])
+            except:
+                pass
+    return finallist[:20]
+
+
+REFS = [
+    '<ref>[http://example.com/a/{n} Title {n}]</ref>',
+    '<ref name="n{n}">{{{{cite web |url=https://example.org/page?id={n}&lang=hi |title=T{n} |date=2014}}}}</ref>',
+    '<ref>{{{{cite book|title=B{n}|url=http://books.example.com/{n}|publisher=P}}}}</ref>',
+    '<ref>Plain http://bare.example.net/{n} text</ref>',
+    '<ref name="n{n}"/>',
+    '<ref group="note">A note without links {n}</ref>',
+    '<!-- <ref>[http://hidden.example.com/{n} hidden]</ref> -->',
+    '<ref>[http://one.example.com/{n} one] and [https://two.example.com/{n} two]</ref>',
+]
+
+
+def synthetic_sections(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        parts = []
+        for n in range(rng.randint(1, 40)):
+            parts.append(f'Sentence {n} of section {i}, with some text around it. ')
+            if rng.random() < 0.6:
+                parts.append(rng.choice(REFS).format(n=i * 100 + n))
+        yield ''.join(parts)
+
+
+def xml_sections(path):
+    for page in read_domain_pages(path):
+        section_text, _ = section_extraction(page.wikitext)
+        for text in section_text:
+            yield text[0]
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    sections = list(xml_sections(sys.argv[1]) if len(sys.argv) > 1 else synthetic_sections(500))
+
+    old_time = new_time = 0.0
+    mismatches = 0
+    for text in sections:
+        start = time.perf_counter()
+        old = [url.replace('&amp;', '&') for url in old_ref_links(text)]
+        old_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = ref_links(text)
+        new_time += time.perf_counter() - start
+
+        if old != new:
+            mismatches += 1
+            if mismatches <= 5:
+                print("MISMATCH\n  old:", old, "\n  new:", new)
+
+    print(f"{len(sections)} sections, {mismatches} mismatches")
+    print(f"old: {old_time:.3f}s  new: {new_time:.3f}s  ({old_time / max(new_time, 1e-9):.0f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
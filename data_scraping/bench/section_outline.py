@@ -0,0 +1,82 @@
+# Splitting long articles into sections: extract_sections.section_extraction()
+# (one scan) against the per-pair regex it replaced:
+#   python3 bench/section_outline.py [<section count>...]
+# Synthetic articles with ~2 KB per section and two === subsections in every
+# == section ==; the old way is skipped once it takes too long.
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_sections import section_extraction, outline_extraction
+
+# the old way is only run while it took less than this (seconds)
+OLD_LIMIT = 20
+
+
+def old_section_extraction(wikicode):
+    # extract_sections.section_extraction() before the single scan
+    try:
+        regex_for_section_names = "(?<===)(.*?)((?= \/==)|(?===))"
+        sections = list(x.group() for x in re.finditer(regex_for_section_names, str(wikicode)))
+
+        main_sections = []
+        for i in sections:
+            if '=' not in i:
+                main_sections.append(i)
+
+        section_text = []
+        for i in range(1, len(main_sections) - 1):
+            x = re.findall('=={}==(.*?)=={}=='.format(main_sections[i - 1], main_sections[i]), str(wikicode),
+                           re.DOTALL)
+            section_text.append(x)
+
+        x = re.findall('=={}==(.*?){}'.format(main_sections[-1], '</text>'), str(wikicode), re.DOTALL)
+        section_text.append(x)
+
+        return section_text, main_sections
+
+    except:
+        return [], []
+
+
+def synthetic_article(sections):
+    paragraph = ("Text of the paragraph with a [[link]], a {{template|x=1}} and a reference."
+                 "<ref>[http://example.com/x x]</ref>\n") * 8
+    parts = ["Intro of the article.\n" + paragraph]
+    for i in range(sections):
+        parts.append(f"== Section {i} ==\n{paragraph}")
+        for j in range(2):
+            parts.append(f"=== Subsection {i}.{j} ===\n{paragraph}")
+    return ''.join(parts) + '</text>'
+
+
+def timed(function, text):
+    start = time.perf_counter()
+    out = function(text)
+    return out, time.perf_counter() - start
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [25, 50, 100, 200, 400, 800, 3200]
+    run_old = True
+    print(f"{'sections':>8} {'chars':>10} {'new ms':>9} {'outline ms':>10} {'old ms':>10}")
+    for count in counts:
+        text = synthetic_article(count)
+        (section_text, names), new_time = timed(section_extraction, text)
+        (_, outline), outline_time = timed(outline_extraction, text)
+        assert len(names) == count and len(section_text) == count
+        assert sum(len(section['subsections']) for section in outline) == 2 * count
+
+        old = '-'
+        if run_old:
+            _, old_time = timed(old_section_extraction, text)
+            old = f'{old_time * 1000:10.1f}'
+            run_old = old_time < OLD_LIMIT / 4
+        print(f"{count:8} {len(text):10} {new_time * 1000:9.2f} {outline_time * 1000:10.2f} {old:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Per-page CPU time of page_prep.prepare_page() (every section parsed once)
+# against the path it replaced, relevant_sections() + remove_templates() +
+# cleaning() for the intro, on the same pages:
+#   python3 bench/section_processing.py [<domain-wise xml file>]
+# Without a file, synthetic pages with templates and citations are used. Both
+# paths get their links from link_extraction.ref_links(), so only the parsing
+# and cleaning differ. The relevant sections and their links should be the
+# same; the old path skipped the clean-up of sections without templates, so
+# their content may differ in whitespace and html.
+import os
+import re
+import sys
+import time
+import random
+import warnings
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mwparserfromhell
+
+from dump_reader import Page, read_domain_pages
+from extract_sections import section_extraction
+from page_extract import intro_extract
+from preprocessing import strip_metadata, strip_html_tags
+from link_extraction import ref_links
+from page_prep import prepare_page
+
+
+def old_relevant_sections(section_text):
+    # extract_sections.relevant_sections(), every section parsed twice
+    try:
+        indice_list = []
+        denom = len(section_text)
+        lenlist = []
+        for i in section_text:
+            temp = mwparserfromhell.parse(i[0])
+            lenlist.append(len(temp.strip_code().strip()))
+
+        avglen = sum(lenlist) // denom
+
+        relevant_sections = []
+        for i in range(denom):
+            temp = mwparserfromhell.parse(section_text[i][0])
+            temp = temp.strip_code().strip()
+            if len(temp) >= int(avglen):
+                relevant_sections.append(section_text[i][0])
+                indice_list.append(i)
+
+        return relevant_sections, indice_list
+
+    except:
+        return [], []
+
+
+def old_cleaning(page_text):
+    # preprocessing.cleaning(), two more parses and the clean-up once per template
+    temp = mwparserfromhell.parse(page_text)
+    template_list = temp.filter_templates()
+    temp = strip_metadata(temp)
+    temp = mwparserfromhell.parse(temp)
+    temp = str(temp.strip_code().strip())
+
+    for j in template_list:
+        temp = temp.replace(str(j), '')
+        temp = temp.replace('\n', ' ')
+        temp = re.sub(r'\s\s+', ' ', temp)
+        temp = strip_html_tags(temp)
+        temp = re.sub(r'\s\s+', ' ', temp)
+
+    return temp
+
+
+def old_remove_templates(section_text):
+    # preprocessing.remove_templates(), the same as cleaning() for every section
+    filtered_section = []
+    for text in section_text:
+        try:
+            filtered_section.append(old_cleaning(text))
+        except Exception as e:
+            print(e)
+    return filtered_section
+
+
+def old_prepare_page(page):
+    # the pipeline()/intro_data() of main.py before prepare_page()
+    intro = mwparserfromhell.parse(intro_extract(page.wikitext))
+    output = [{'title': 'Introduction', 'content': old_cleaning(intro), 'links': ref_links(intro)}]
+
+    sections, main_section_names = section_extraction(page.wikitext)
+    relevant, relevant_indice = old_relevant_sections(sections)
+    clean = old_remove_templates(relevant)
+    for i in range(len(relevant)):
+        output.append({'title': main_section_names[relevant_indice[i]].strip(), 'content': clean[i],
+                       'links': ref_links(str(relevant[i]))})
+
+    return {'title': page.title, 'sections': output}
+
+
+def synthetic_pages(count, seed=0):
+    rng = random.Random(seed)
+    for p in range(count):
+        def paragraph(n):
+            parts = []
+            for s in range(n):
+                parts.append(f"Sentence {s} with a [[link|linked text]] and '''bold''' words in it. ")
+                if rng.random() < 0.3:
+                    parts.append("{{cite web|url=http://example.com/%d|title=T}} " % s)
+                if rng.random() < 0.4:
+                    parts.append(f"<ref>[http://example.org/{p}/{s} Source {s}]</ref>")
+                if rng.random() < 0.05:
+                    parts.append("<small>note</small> ")
+            return ''.join(parts) + '\n'
+
+        parts = ["{{Infobox animal|name=X|image=x.jpg}}\n", paragraph(rng.randint(5, 30))]
+        for i in range(rng.randint(3, 25)):
+            parts.append(f"== Section {i} ==\n{paragraph(rng.randint(1, 60))}")
+            if rng.random() < 0.5:
+                parts.append(f"=== Subsection {i} ===\n{paragraph(rng.randint(1, 20))}")
+        yield Page(title=f'Synthetic page {p}', ns='0', id=str(p), wikitext=''.join(parts))
+
+
+def cpu_times(prepare, pages):
+    out = []
+    times = []
+    for page in pages:
+        start = time.process_time()
+        out.append(prepare(page))
+        times.append(time.process_time() - start)
+    return out, times
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    pages = list(read_domain_pages(sys.argv[1]) if len(sys.argv) > 1 else synthetic_pages(200))
+
+    old, old_times = cpu_times(old_prepare_page, pages)
+    new, new_times = cpu_times(prepare_page, pages)
+
+    different = content_differs = 0
+    for old_article, new_article in zip(old, new):
+        old_sections = [(section['title'], section['links']) for section in old_article['sections']]
+        new_sections = [(section['title'], section['links']) for section in new_article['sections']]
+        if old_sections != new_sections:
+            different += 1
+            if different <= 5:
+                print("DIFFERENT SECTIONS", old_article['title'], "\n  old:", [title for title, _ in old_sections],
+                      "\n  new:", [title for title, _ in new_sections])
+        elif [s['content'] for s in old_article['sections']] != [s['content'] for s in new_article['sections']]:
+            content_differs += 1
+
+    print(f"{len(pages)} pages: {different} with different sections or links, "
+          f"{content_differs} more with different content")
+    print(f"{'ms per page':>12} {'mean':>8} {'median':>8} {'max':>8} {'total s':>8}")
+    for name, times in [('old', old_times), ('prepare_page', new_times)]:
+        print(f"{name:>12} {statistics.mean(times) * 1000:8.2f} {statistics.median(times) * 1000:8.2f} "
+              f"{max(times) * 1000:8.2f} {sum(times):8.2f}")
+    print(f"{sum(old_times) / max(sum(new_times), 1e-9):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
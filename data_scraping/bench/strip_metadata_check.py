@@ -0,0 +1,73 @@
+# Checks that preprocessing.strip_metadata() stays linear on pathological input
+# and gives the same text as the regex it replaced:
+#   python3 bench/strip_metadata_check.py
+# Exits with 1 if an output differs or the runtime grows faster than the input.
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import strip_metadata
+
+OLD_PATTERN = '(<format>((.|\n)*?)</format>)|(<contributor>((.|\n)*?)</contributor>)|(<timestamp>((.|\n)*?)</timestamp>)|(<ns>((.|\n)*?)</ns>)|(<id>((.|\n)*?)</id>)|(<parentid>((.|\n)*?)</parentid>)|(<ip>((.|\n)*?)</ip>)|(<comment>((.|\n)*?)</comment>|(<model>((.|\n)*?)</model>|(<sha1>((.|\n)*?)</sha1>)))'
+
+# the old regex is only run up to this size, it takes seconds past it
+OLD_MAX_REPEAT = 2000
+
+
+def old_strip_metadata(text):
+    return re.sub(OLD_PATTERN, '', str(text))
+
+
+def unclosed_comments(n):
+    # an edit summary opened and never closed, over and over
+    return '<comment>reverted edit\n' * n + 'text of the page\n'
+
+
+def nested_contributors(n):
+    return ''.join(f'<contributor>\n<username>U{i}</username>\n<id>{i}</id>\n<ip>10.0.0.{i % 256}</ip>\n'
+                   f'</contributor>\nline {i}\n' for i in range(n))
+
+
+def big_comment(n):
+    return '<comment>' + 'x' * (n * 50) + '</comment>' + '<timestamp>2020</timestamp>text\n'
+
+
+def timed(function, text):
+    start = time.perf_counter()
+    out = function(text)
+    return out, time.perf_counter() - start
+
+
+def main():
+    failed = False
+    for name, make in [('unclosed <comment>', unclosed_comments), ('nested <contributor>', nested_contributors),
+                       ('big <comment>', big_comment)]:
+        per_char = []
+        for n in (500, 1000, 2000, 4000, 16000, 64000):
+            text = make(n)
+            new, new_time = timed(strip_metadata, text)
+            per_char.append(new_time / len(text))
+            line = f'{name:22} n={n:6} chars={len(text):9}  new {new_time * 1000:8.2f}ms'
+
+            if n <= OLD_MAX_REPEAT:
+                old, old_time = timed(old_strip_metadata, text)
+                line += f'  old {old_time * 1000:9.2f}ms'
+                if old != new:
+                    line += '  OUTPUT DIFFERS'
+                    failed = True
+            print(line)
+
+        # linear: the time per character doesn't grow with the input
+        if per_char[-1] > 5 * min(per_char):
+            print(f'{name}: time per character grew {per_char[-1] / min(per_char):.1f}x')
+            failed = True
+
+    print('FAILED' if failed else 'ok')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
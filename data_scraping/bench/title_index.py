@@ -0,0 +1,89 @@
+# Page classification with the precompiled title index against the per-page
+# list rebuild it replaced, over a million synthetic titles:
+#   python3 bench/title_index.py [<no. of titles, default 1000000>] [<no. of domains, default 20>]
+# The old way is O(titles) per page, so it is timed on a sample of pages and
+# scaled up. Also times writing the matched pages with DomainWriters against
+# reopening the domain file for every page.
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from domain_index import build_title_index, normalize_title, DomainWriters
+
+
+def synthetic_titles(titles, domains, lang='hi', seed=0):
+    rng = random.Random(seed)
+    data = {f'domain{d}': {lang: []} for d in range(domains)}
+    for i in range(titles):
+        # a few titles are in two domains
+        for d in {rng.randrange(domains), rng.randrange(domains)} if i % 50 == 0 else {rng.randrange(domains)}:
+            data[f'domain{d}'][lang].append(f'Synthetic_title_{i}_of_the_list')
+    return data
+
+
+def old_classify(title, data, lang):
+    # domain_list_allocate() before the index, without its mwparserfromhell parse
+    found = []
+    for domain in list(data.keys()):
+        title_list = data[domain][str(lang)]
+        title_list = [' '.join(temp.split('_')) for temp in title_list]
+        if title in title_list:
+            found.append(domain)
+    return found
+
+
+def main():
+    titles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    domains = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    data = synthetic_titles(titles, domains)
+    # the dump has as many pages again that are in no domain
+    pages = [f'Synthetic title {i} of the list' for i in range(2 * titles)]
+    random.Random(1).shuffle(pages)
+
+    start = time.perf_counter()
+    index = build_title_index(data, 'hi')
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = 0
+    for title in pages:
+        matched += bool(index.get(normalize_title(title)))
+    new = time.perf_counter() - start
+    print(f"index: built in {build:.2f}s, {len(pages)} pages classified in {new:.2f}s "
+          f"({new / len(pages) * 1e6:.2f}us per page, {matched} matched)")
+
+    sample = pages[:20]
+    start = time.perf_counter()
+    for title in sample:
+        old_classify(title, data, 'hi')
+    old = (time.perf_counter() - start) / len(sample)
+    print(f"old:   {old * 1000:.0f}ms per page, ~{old * len(pages) / 3600:.1f}h for the {len(pages)} pages "
+          f"({old * len(pages) / (build + new):.0f}x)")
+
+    written = [title for title in pages if index.get(normalize_title(title))][:20000]
+    text = '<page>\n' + 'x' * 2000 + '\n</page>\n'
+    with tempfile.TemporaryDirectory() as tmp:
+        pattern = os.path.join(tmp, 'new_{domain}.xml')
+        start = time.perf_counter()
+        with DomainWriters(pattern) as writers:
+            for title in written:
+                for domain in index[normalize_title(title)]:
+                    writers.write(domain, text)
+        new = time.perf_counter() - start
+
+        pattern = os.path.join(tmp, 'old_{domain}.xml')
+        start = time.perf_counter()
+        for title in written:
+            for domain in index[normalize_title(title)]:
+                with open(pattern.format(domain=domain), 'a') as writefile:
+                    writefile.write(text)
+        old = time.perf_counter() - start
+    print(f"writing {len(written)} pages: DomainWriters {new:.2f}s, reopening per page {old:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
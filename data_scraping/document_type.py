@@ -5,7 +5,14 @@ def content_type(url):
         r = requests.get(url)
     except requests.exceptions.RequestException as e:  # This is the correct syntax
         return 'na'
-    content_type = r.headers.get('content-type')
+
+    return type_from_header(r.headers.get('content-type'))
+
+
+def type_from_header(content_type):
+    """Maps the content-type header of an already fetched response to pdf/html/na."""
+    if content_type is None:
+        return 'na'
 
     try:
         if 'application/pdf' in content_type:
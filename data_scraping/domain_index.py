@@ -0,0 +1,43 @@
+def normalize_title(title):
+    """Titles in final_titles.json use underscores, the dump uses spaces."""
+    return ' '.join(title.split('_')).strip()
+
+
+def build_title_index(data, lang):
+    """Compiles the per-domain title lists of final_titles.json into one
+    {normalized title: [domains]} dict, so classifying a page is a single lookup.
+    """
+    index = {}
+    for domain in data:
+        for title in data[domain].get(lang, []):
+            domains = index.setdefault(normalize_title(title), [])
+            if domain not in domains:
+                domains.append(domain)
+
+    return index
+
+
+class DomainWriters:
+    """Keeps one buffered append handle open per domain for the whole run."""
+
+    def __init__(self, path_pattern, buffering=1 << 20):
+        # e.g. 'en_{domain}.xml'
+        self.path_pattern = path_pattern
+        self.buffering = buffering
+        self._files = {}
+
+    def write(self, domain, text):
+        if domain not in self._files:
+            self._files[domain] = open(self.path_pattern.format(domain=domain), 'a', buffering=self.buffering)
+        self._files[domain].write(text)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
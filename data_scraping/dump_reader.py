@@ -0,0 +1,166 @@
+import re
+import subprocess
+import xml.sax
+
+from collections import deque, namedtuple
+
+from domain_index import normalize_title
+from metrics import metrics
+
+# a parsed wikipedia page, `wikitext` being the raw markup of its latest
+# revision and `revision` the id of that revision
+Page = namedtuple('Page', ['title', 'ns', 'id', 'wikitext', 'revision'], defaults=('',))
+
+# the elements we keep, <id> directly under <page> is the page id and under
+# <revision> the revision id (the contributor ids are ignored); with several
+# revisions in a page (e.g. in the adds/changes dumps) the last one wins
+PAGE_FIELDS = {'title': 'title', 'ns': 'ns', 'text': 'wikitext'}
+ID_FIELDS = {2: 'id', 3: 'revision'}
+
+
+class WikiXmlHandler(xml.sax.handler.ContentHandler):
+    """Content handler for Wiki XML data using SAX"""
+
+    def __init__(self, titles=None):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self._buffer = None
+        self._values = {}
+        self._current_tag = None
+        self._current_field = None
+        self._depth = 0
+        # finished pages waiting to be consumed, drained by iter_pages()
+        self._pages = deque()
+        # allow-list of normalized titles, pages not in it are skipped
+        self._titles = titles
+        self._skipping = False
+
+    def characters(self, content):
+        """Characters between opening and closing tags"""
+        if self._current_tag:
+            self._buffer.append(content)
+
+    def startElement(self, name, attrs):
+        """Opening tag of element"""
+        if name == 'page':
+            # drop whatever came before the page (e.g. <siteinfo>)
+            self._values = {}
+            self._skipping = False
+            self._depth = 0
+
+        self._depth += 1
+        if self._skipping:
+            return
+
+        # only buffer the characters of the fields we keep
+        if name == 'id':
+            field = ID_FIELDS.get(self._depth)
+        else:
+            field = PAGE_FIELDS.get(name)
+        if field is not None:
+            self._current_tag = name
+            self._current_field = field
+            self._buffer = []
+
+    def endElement(self, name):
+        """Closing tag of element"""
+        self._depth -= 1
+
+        if self._skipping:
+            if name == 'page':
+                self._skipping = False
+                self._values = {}
+            return
+
+        if name == self._current_tag:
+            self._values[self._current_field] = ''.join(self._buffer)
+            self._buffer = None
+            self._current_tag = None
+
+            if name == 'title' and self._titles is not None:
+                # not a target page: don't buffer anything of it (e.g. its <text>)
+                if normalize_title(self._values['title']) not in self._titles:
+                    self._skipping = True
+                    return
+
+        if name == 'page':
+            self._pages.append(Page(**{field: self._values.get(field, '') for field in Page._fields}))
+            # start afresh so nothing from this page is kept around
+            self._values = {}
+
+
+def iter_pages(lines, titles=None):
+    """Feeds the xml lines to a SAX parser and yields the pages one at a time.
+
+    Only the page being parsed is held in memory, a yielded page is not
+    referenced by the parser anymore. With `titles` given, only the pages whose
+    title is in that set are yielded.
+    """
+    handler = WikiXmlHandler(titles)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+
+    for line in lines:
+        with metrics.timer('xml_parse'):
+            parser.feed(line)
+        while handler._pages:
+            yield handler._pages.popleft()
+
+
+def read_chunks(stream, size=1 << 16):
+    # the time spent waiting on bzcat is the decompression stage
+    while True:
+        with metrics.timer('decompress'):
+            chunk = stream.read(size)
+        if not chunk:
+            return
+        metrics.inc('dump_bytes', len(chunk))
+        yield chunk
+
+
+def read_dump(bz2_path, titles=None):
+    """Yields the pages of a .bz2 wikipedia dump, decompressed with bzcat."""
+    with open(bz2_path, 'rb') as dump:
+        process = subprocess.Popen(['bzcat'], stdin=dump, stdout=subprocess.PIPE)
+        try:
+            yield from iter_pages(read_chunks(process.stdout), titles)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+
+
+def page_to_xml(page):
+    """Writes a page in the layout of the domain-wise xml files."""
+    return (f"<page>\n<title>{page.title}</title>\n<ns>{page.ns}</ns>\n<id>{page.id}</id>\n"
+            f"<revid>{page.revision}</revid>\n<text>{page.wikitext}</text>\n</page>\n")
+
+
+def parse_page(page_str):
+    """Reads one <page> block of a domain-wise xml file back into a Page."""
+    def field(query):
+        found = re.search(query, page_str, re.DOTALL)
+        return found.group(1) if found else ''
+
+    return Page(title=field("<title>(.*?)</title>"), ns=field("<ns>(.*?)</ns>"),
+                id=field("<id>(.*?)</id>"), wikitext=field("<text>(.*)</text>"),
+                revision=field("<revid>(.*?)</revid>"))
+
+
+def read_domain_pages(xml_path):
+    """Yields the pages of a domain-wise xml file one at a time.
+
+    The file is read line by line, every page sits between a `<page>` and a
+    `</page>` line (see page_to_xml()), so memory is bounded by the biggest page.
+    """
+    lines = None
+    with open(xml_path, 'r') as f:
+        for line in f:
+            if lines is None:
+                if line.startswith('<page>'):
+                    lines = [line]
+                continue
+
+            lines.append(line)
+            if line.rstrip('\n') == '</page>':
+                yield parse_page(''.join(lines))
+                lines = None
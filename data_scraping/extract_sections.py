@@ -1,63 +1,63 @@
 import re
-import mwparserfromhell
+
+
+# any line starting with '=' may be a heading, the rest of the text is never looked at
+heading_line=re.compile(r'^=[^\n]*$',re.MULTILINE)
+
+
+def headings(wikicode):
+  # yields (level, title, start of the heading line, end of the heading line) in one scan
+  for match in heading_line.finditer(str(wikicode)):
+    line=match.group().rstrip()
+    # comments after a heading (== Legacy == <!-- keep -->) don't make it text
+    while line.endswith('-->') and '<!--' in line:
+      line=line[:line.rindex('<!--')].rstrip()
+    level=min(len(line)-len(line.lstrip('=')),len(line)-len(line.rstrip('=')),6)
+    if level and len(line)>2*level:
+      yield level,line[level:-level],match.start(),match.end()
+
+
+def outline_extraction(wikicode):
+  # splits the page into its intro and its ==sections== with their ===subsections===,
+  # every section/subsection as {'title','text'} (+ 'subsections' for sections)
+  text=str(wikicode)
+  intro_end=len(text)
+  outline=[]
+  open_section=None
+  open_subsection=None
+
+  for level,title,start,end in headings(text):
+    # only == and === headings split the page, the others stay in the text
+    if level not in (2,3):
+      continue
+    if open_subsection is not None:
+      open_subsection['text']=text[open_subsection.pop('start'):start]
+      open_subsection=None
+    if level==2:
+      if open_section is not None:
+        open_section['text']=text[open_section.pop('start'):start]
+      else:
+        intro_end=start
+      open_section={'title':title,'start':end,'subsections':[]}
+      outline.append(open_section)
+    elif level==3 and open_section is not None:
+      open_subsection={'title':title,'start':end}
+      open_section['subsections'].append(open_subsection)
+
+  if open_subsection is not None:
+    open_subsection['text']=text[open_subsection.pop('start'):]
+  if open_section is not None:
+    open_section['text']=text[open_section.pop('start'):]
+
+  return text[:intro_end],outline
 
 
 def section_extraction(wikicode):
-  # get all section names:
-  try:
-    regex_for_section_names="(?<===)(.*?)((?= \/==)|(?===))"
-    sections=list(x.group() for x in re.finditer(regex_for_section_names,str(wikicode)))
-
-    main_sections=[]
-    subsections=[]
-    for i in sections:
-      if '=' not in i:
-        main_sections.append(i)
-      elif '=' in i and i.count('=')==1:
-        subsections.append(i)
-
-    section_text=[]
-    for i in range(1,len(main_sections)-1):
-      x = re.findall('=={}==(.*?)=={}=='.format(main_sections[i-1],main_sections[i]),str(wikicode),re.DOTALL)
-      section_text.append(x)
-
-    # for the last section heading which may extend till the end of the text:
-    x = re.findall('=={}==(.*?){}'.format(main_sections[-1],'</text>'),str(wikicode),re.DOTALL)
-    section_text.append(x)
-
-    # sectionwise extracted text
-    return section_text,main_sections
-
-  except:
-    return [],[]
-
-
-def relevant_sections(section_text):
-  try:
-    # getting length of sections first:
-    indice_list=[]
-    denom=len(section_text)
-    lenlist=[]
-    for i in section_text:
-      temp = mwparserfromhell.parse(i[0])
-      # print(temp.strip_code().strip())
-      lenlist.append(len(temp.strip_code().strip()))
-
-    avglen=sum(lenlist)//denom
-
-
-  # only consider those sections with character-count>= average
-    relevant_sections=[]
-    for i in range(denom):
-      temp = mwparserfromhell.parse(section_text[i][0])
-      temp=temp.strip_code().strip()
-      if len(temp)>=int(avglen):
-        relevant_sections.append(section_text[i][0])
-        indice_list.append(i)
-
-    # print('No. of relevant sections:',len(relevant_sections),'\n-------------------------------\n')
-    return relevant_sections,indice_list
-
-  except:
-    return [],[]
+  # get all the ==sections== and their text (subsections included) in a single scan:
+  _,outline=outline_extraction(wikicode)
+
+  main_sections=[section['title'] for section in outline]
+  # sectionwise extracted text
+  section_text=[[section['text']] for section in outline]
 
+  return section_text,main_sections
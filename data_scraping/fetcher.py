@@ -0,0 +1,271 @@
+import re
+import time
+import asyncio
+import threading
+import multiprocessing
+
+from urllib.parse import urlsplit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+from document_type import type_from_header
+from host_health import HostHealth
+from reference_cache import normalize_url
+from metrics import metrics
+from webscrape import pdf_to_text, html_to_text, HtmlTextExtractor
+
+
+def clean_text(scraped_text):
+    scraped_text = scraped_text.replace('\n', ' ')
+    scraped_text = scraped_text.replace('\r', ' ')
+    scraped_text = scraped_text.replace('\b', ' ')
+    # remove excess spacings also:
+    return re.sub(r'\s\s+', ' ', scraped_text)
+
+
+def extract_text(body, contentt):
+    """Gets the text of a fetched reference by its type (blocking, runs in a worker process)."""
+    if contentt == 'pdf':
+        scraped_text = pdf_to_text(body)
+    elif contentt == 'html':
+        scraped_text = html_to_text(body)
+    else:
+        scraped_text = ""
+
+    return clean_text(scraped_text)
+
+
+class Fetcher:
+    """Fetches reference urls with one keep-alive connection pool for the whole run.
+
+    The asyncio loop lives in a background thread so that the (synchronous)
+    scraping scripts can hand it whole pages worth of urls at once. At most
+    `max_connections` requests are in flight overall and `per_host` per host.
+    PDFs are parsed in a pool of `pdf_processes` worker processes (started by a
+    forkserver, so scripts using a Fetcher need an `if __name__ == '__main__'`
+    guard), so they hold neither the loop nor the GIL, and PDFs bigger than `max_pdf_bytes` are
+    abandoned mid-download. Html is parsed as it downloads and no more of it
+    is read once there's enough text (or `max_html_bytes` have come in).
+    Timeouts are learnt per host and failing hosts are skipped for a while (see
+    HostHealth), and whatever is still running after `page_timeout` seconds is
+    given up so one page can't stall the run.
+    A url is fetched once per run: pages asking for a url that is being fetched
+    wait for that fetch, and the texts of the last scraped urls (up to
+    `memo_chars` characters in all) are kept in memory for the pages that cite
+    them later; older ones are still answered by the cache.
+    """
+
+    # statuses that won't change on a retry, so an empty result is cached too
+    CACHED_FAILURES = {400, 401, 403, 404, 410}
+
+    def __init__(self, max_connections=15, per_host=4, timeout=5, page_timeout=120, cache=None,
+                 pdf_processes=None, max_pdf_bytes=20 << 20, max_html_bytes=2 << 20, health=None,
+                 memo_chars=4 << 20):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.page_timeout = page_timeout
+        # optional ReferenceCache, checked before any request is made
+        self.cache = cache
+        self.max_pdf_bytes = max_pdf_bytes
+        self.max_html_bytes = max_html_bytes
+        self.health = health if health is not None else HostHealth(timeout)
+        # the workers are started from the loop thread: forking there would copy
+        # whatever locks the other threads hold at that moment
+        self._pdf_pool = ProcessPoolExecutor(pdf_processes, mp_context=multiprocessing.get_context('forkserver'))
+        self.memo_chars = memo_chars
+        # normalized url -> task fetching it, and -> text of the ones done
+        self._in_flight = {}
+        self._memo = OrderedDict()
+        self._memo_len = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._session = self._submit(self._open_session()).result()
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+        return aiohttp.ClientSession(connector=connector)
+
+    async def _read_pdf(self, r):
+        # returns None as soon as the pdf turns out to be over the size cap
+        length = r.content_length
+        if length is not None and length > self.max_pdf_bytes:
+            return None
+
+        body = bytearray()
+        async for chunk in r.content.iter_chunked(1 << 16):
+            body += chunk
+            if len(body) > self.max_pdf_bytes:
+                metrics.inc('bytes_fetched', len(body))
+                return None
+        metrics.inc('bytes_fetched', len(body))
+        return bytes(body)
+
+    async def _read_html(self, r):
+        extractor = HtmlTextExtractor(encoding=r.charset)
+        read = 0
+        async for chunk in r.content.iter_chunked(1 << 16):
+            read += len(chunk)
+            if extractor.feed(chunk) or read > self.max_html_bytes:
+                break
+        metrics.inc('bytes_fetched', read)
+        return clean_text(extractor.text())
+
+    async def scrape(self, url):
+        """Returns the text of one reference, '' if it can't be scraped."""
+        key = normalize_url(url)
+        if key in self._memo:
+            metrics.inc('memo_hits')
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._scrape(url))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda task: self._remember(key, task))
+        else:
+            metrics.inc('shared_fetches')
+
+        # a page giving up on the url doesn't cancel it for the others waiting on it
+        return await asyncio.shield(task)
+
+    def _remember(self, key, task):
+        del self._in_flight[key]
+        # failures aren't remembered, a later page may have better luck
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        text = task.result()
+        if key in self._memo or len(text) > self.memo_chars:
+            return
+        self._memo[key] = text
+        self._memo_len += len(text)
+        while self._memo_len > self.memo_chars:
+            self._memo_len -= len(self._memo.popitem(last=False)[1])
+
+    async def _scrape(self, url):
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            metrics.inc('cache_hits')
+            return entry['text']
+        if self.cache:
+            metrics.inc('cache_misses')
+
+        # a stale entry is revalidated instead of downloaded again if we can
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        host = urlsplit(url).hostname
+        if not self.health.allow(host):
+            metrics.inc('circuit_skips', host=host)
+            return ""
+        budget = self.health.timeout_for(host)
+        timeout = aiohttp.ClientTimeout(sock_connect=budget, sock_read=budget)
+
+        try:
+            # a single request per url: its headers pick the extractor and its
+            # body is what gets extracted
+            start = time.monotonic()
+            async with self._session.get(url, headers=headers, timeout=timeout) as r:
+                metrics.inc('http_status', status=r.status)
+                if r.status in HostHealth.HOST_FAILURES:
+                    self.health.failure(host)
+                    metrics.inc('host_failures', host=host)
+                else:
+                    self.health.success(host, time.monotonic() - start)
+
+                if r.status == 304 and entry is not None:
+                    metrics.inc('revalidated')
+                    self.cache.revalidated(url)
+                    return entry['text']
+
+                if r.status != 200:
+                    if self.cache and r.status in self.CACHED_FAILURES:
+                        self.cache.put(url, "", status=r.status)
+                    return ""
+                contentt = type_from_header(r.headers.get('content-type'))
+                etag = r.headers.get('ETag')
+                last_modified = r.headers.get('Last-Modified')
+
+                if contentt == 'pdf':
+                    body = await self._read_pdf(r)
+                    if body is None:
+                        if self.cache:
+                            self.cache.put(url, "", contentt, r.status, etag, last_modified)
+                        return ""
+                elif contentt == 'html':
+                    text = await self._read_html(r)
+                else:
+                    text = ""
+            metrics.observe('fetch', time.monotonic() - start)
+
+            if contentt == 'pdf':
+                # pdf parsing is CPU bound, so it runs in the worker processes
+                with metrics.timer('pdf_extract'):
+                    text = await self._loop.run_in_executor(self._pdf_pool, extract_text, body, contentt)
+
+        except asyncio.CancelledError:
+            self.health.release(host)
+            raise
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            self.health.failure(host)
+            metrics.inc('host_failures', host=host)
+            metrics.inc('fetch_errors', error=type(e).__name__)
+            return ""
+
+        except Exception as e:
+            # e.g. too many redirects or an invalid url: no answer about the host,
+            # but a probe it was must not keep the host blocked
+            self.health.release(host)
+            metrics.inc('fetch_errors', error=type(e).__name__)
+            return ""
+
+        if self.cache:
+            self.cache.put(url, text, contentt, r.status, etag, last_modified)
+
+        return text
+
+    async def scrape_all(self, link_lists):
+        """Scrapes a list of url lists (e.g. one per section) concurrently.
+
+        References still running when the page timeout is hit come back as ''.
+        """
+        tasks = [[asyncio.ensure_future(self.scrape(url)) for url in links] for links in link_lists]
+        flat = [task for links in tasks for task in links]
+        if flat:
+            done, pending = await asyncio.wait(flat, timeout=self.page_timeout)
+            if pending:
+                print("TIMEOUT")
+            for task in pending:
+                task.cancel()
+
+        return [[task.result() if task.done() and not task.cancelled() else "" for task in links]
+                for links in tasks]
+
+    def scrape_many(self, link_lists):
+        """Blocking version of scrape_all(), can be called from any thread."""
+        return self._submit(self.scrape_all(link_lists)).result()
+
+    def close(self):
+        self._submit(self._session.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._pdf_pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,77 @@
+import time
+
+
+class HostHealth:
+    """Per-host latency estimates and circuit breaker for the reference fetcher.
+
+    Every answered request feeds an exponentially weighted mean and deviation of
+    the host's response time, from which the host's timeout is derived (as TCP
+    does for its retransmission timeout), so fast hosts fail fast and slow but
+    working ones get more room. After `max_failures` failures in a row (time-outs,
+    connection errors, 403/429/5xx) the host's circuit opens and its urls are
+    skipped for `cooldown` seconds, doubling on every re-open up to `max_cooldown`.
+    Once the cooldown is over, a single request is let through to probe the host.
+    """
+
+    # statuses that say the host (not just the url) won't serve us right now
+    HOST_FAILURES = {403, 429, 500, 502, 503, 504}
+
+    def __init__(self, timeout=5, min_timeout=1, max_timeout=15, max_failures=3,
+                 cooldown=60, max_cooldown=900, alpha=0.125, beta=0.25):
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.alpha = alpha
+        self.beta = beta
+        self._hosts = {}
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = {'mean': None, 'dev': 0.0, 'failures': 0,
+                                 'open_until': 0.0, 'opened': 0, 'probing': False}
+        return self._hosts[host]
+
+    def allow(self, host):
+        """False while the host's circuit is open (or while its probe is in flight)."""
+        state = self._host(host)
+        if state['failures'] < self.max_failures:
+            return True
+        if time.monotonic() < state['open_until'] or state['probing']:
+            return False
+        state['probing'] = True
+        return True
+
+    def timeout_for(self, host):
+        state = self._host(host)
+        if state['mean'] is None:
+            return self.timeout
+        budget = state['mean'] + 4 * state['dev']
+        return min(max(budget, self.min_timeout), self.max_timeout)
+
+    def success(self, host, latency):
+        state = self._host(host)
+        if state['mean'] is None:
+            state['mean'] = latency
+            state['dev'] = latency / 2
+        else:
+            state['dev'] += self.beta * (abs(latency - state['mean']) - state['dev'])
+            state['mean'] += self.alpha * (latency - state['mean'])
+        state['failures'] = 0
+        state['opened'] = 0
+        state['probing'] = False
+
+    def failure(self, host):
+        state = self._host(host)
+        state['failures'] += 1
+        state['probing'] = False
+        if state['failures'] >= self.max_failures:
+            cooldown = min(self.cooldown * 2 ** state['opened'], self.max_cooldown)
+            state['open_until'] = time.monotonic() + cooldown
+            state['opened'] += 1
+
+    def release(self, host):
+        """The request was abandoned (e.g. at the page deadline) without an answer."""
+        self._host(host)['probing'] = False
@@ -0,0 +1,284 @@
+import os
+import gzip
+import json
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compressed outputs are recognised by their file extension
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def compression_of(path):
+    for compression, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def compress_frame(data, compression, level=None):
+    """Compresses data into one gzip member / zstd frame, decodable on its own."""
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6 if level is None else level)
+    if zstandard is None:
+        raise ImportError("writing .zst outputs needs the zstandard package")
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+
+def _decompressor(compression):
+    if compression == 'gzip':
+        return zlib.decompressobj(wbits=31)
+    if zstandard is None:
+        raise ImportError("reading .zst outputs needs the zstandard package")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def iter_frames(f, compression):
+    """Yields (offset of the frame's end, decompressed frame) for each complete frame of a file."""
+    decompressor = _decompressor(compression)
+    out = []
+    frame_end = 0
+    fed = 0
+    pending = b''
+    while True:
+        chunk = pending or f.read(1 << 20)
+        pending = b''
+        if not chunk:
+            # a frame cut short by a crash is never yielded
+            return
+        try:
+            out.append(decompressor.decompress(chunk))
+        except Exception:
+            # garbage after the last good frame ends the readable part
+            return
+        fed += len(chunk)
+        if decompressor.eof:
+            pending = decompressor.unused_data
+            frame_end += fed - len(pending)
+            yield frame_end, b''.join(out)
+            decompressor = _decompressor(compression)
+            out = []
+            fed = 0
+
+
+class ResumableOutput:
+    """JSONL output with a journal of the titles already written to it.
+
+    After each article line (or batch of lines) is written and synced, the
+    titles and the output size are appended to `<path>.journal`. On start-up the journal is read back
+    into a set, and anything in the output past the last journaled size (a line
+    cut short by a crash, or written but never journaled) is truncated, so a
+    restarted run skips finished pages in O(1) and writes no duplicates.
+
+    A path ending in .gz or .zst gives a compressed output: articles are
+    batched and each batch is written as one gzip member / zstd frame, so the
+    file is a plain concatenation of independently decodable frames (what
+    `zcat`/`zstdcat` and the dataset readers expect) and every journaled offset
+    is a frame boundary. A batch is written once it has `batch_size` articles
+    or `batch_bytes` of json, or has been open `flush_interval` seconds; the
+    articles of a batch lost in a crash are simply scraped again.
+    """
+
+    def __init__(self, path, done=(), sync=True, batch_size=None, batch_bytes=8 << 20,
+                 flush_interval=60, level=None):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.sync = sync
+        self.compression = compression_of(path)
+        self.level = level
+        # uncompressed outputs keep writing one line at a time
+        if batch_size is None:
+            batch_size = 100 if self.compression else 1
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self._batch = []
+        self._batch_titles = []
+        self._batch_len = 0
+        self._batch_started = time.monotonic()
+        # titles to skip: the journaled ones, the batched ones and e.g. existing_titles.json
+        self.titles = set(done)
+
+        if os.path.exists(self.journal_path):
+            end = self._load_journal()
+        else:
+            end = self._rebuild_journal()
+
+        self._repair(end)
+        self._out = open(self.path, 'ab')
+        self._journal = open(self.journal_path, 'ab')
+
+    def _load_journal(self):
+        end = 0
+        valid = 0
+        with open(self.journal_path, 'rb') as journal:
+            for line in journal:
+                try:
+                    offset, title = line.decode('utf-8').rstrip('\n').split('\t', 1)
+                    if not line.endswith(b'\n'):
+                        raise ValueError('partial journal line')
+                    self.titles.add(json.loads(title))
+                    end = int(offset)
+                except ValueError:
+                    break
+                valid += len(line)
+
+        # drop a journal line cut short by a crash
+        if valid < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as journal:
+                journal.truncate(valid)
+
+        return end
+
+    def _rebuild_journal(self):
+        """Journals the complete lines of an output written before the journal existed.
+
+        Outputs written in append mode by older runs can have a line cut short by
+        a crash in the middle (the restarted run appended after it): such lines
+        are kept in the file but not journaled, only a partial line at the very
+        end is cut off.
+        """
+        end = 0
+        with open(self.journal_path, 'wb') as journal:
+            if not os.path.exists(self.path):
+                return end
+
+            with open(self.path, 'rb') as out:
+                if self.compression:
+                    frames = iter_frames(out, self.compression)
+                else:
+                    frames = ((None, line) for line in out)
+
+                for frame_end, frame in frames:
+                    if not self.compression and not frame.endswith(b'\n'):
+                        break
+                    titles = [title for title in map(self._title, frame.splitlines(keepends=True))
+                              if title is not None]
+                    end = frame_end if self.compression else end + len(frame)
+                    for title in titles:
+                        self.titles.add(title)
+                        journal.write(f'{end}\t{json.dumps(title, ensure_ascii=False)}\n'.encode('utf-8'))
+
+        return end
+
+    @staticmethod
+    def _title(line):
+        """Title of a complete article line, None for a line that isn't one."""
+        if not line.endswith(b'\n'):
+            return None
+        start = 0
+        while start != -1:
+            try:
+                article = json.loads(line[start:])
+                return article.get('title') if isinstance(article, dict) else None
+            except ValueError:
+                # the article a restarted run appended to a cut off line
+                start = line.find(b'{"title"', start + 1)
+        return None
+
+    def _repair(self, end):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > end:
+            print(f"Truncating {self.path} to the last journaled article ({end} bytes)")
+            with open(self.path, 'r+b') as out:
+                out.truncate(end)
+
+    def __contains__(self, title):
+        return title in self.titles
+
+    def write(self, article):
+        """Adds one article as a JSONL line, its title is journaled once its batch is written."""
+        self._add((json.dumps(article, ensure_ascii=False) + '\n').encode('utf-8'), article['title'])
+
+    def _add(self, line, title):
+        self._batch.append(line)
+        self._batch_len += len(line)
+        if title is not None:
+            self._batch_titles.append(title)
+            self.titles.add(title)
+
+        if (len(self._batch) >= self.batch_size or self._batch_len >= self.batch_bytes
+                or time.monotonic() - self._batch_started >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes the batched articles (as one frame if compressed), then journals their titles."""
+        if self._batch:
+            data = b''.join(self._batch)
+            if self.compression:
+                data = compress_frame(data, self.compression, self.level)
+            self._out.write(data)
+            self._out.flush()
+            if self.sync:
+                os.fsync(self._out.fileno())
+
+            end = self._out.tell()
+            self._journal.write(''.join(f'{end}\t{json.dumps(title, ensure_ascii=False)}\n'
+                                        for title in self._batch_titles).encode('utf-8'))
+            self._journal.flush()
+            if self.sync:
+                os.fsync(self._journal.fileno())
+
+        self._batch = []
+        self._batch_titles = []
+        self._batch_len = 0
+        self._batch_started = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._out.close()
+        self._journal.close()
+
+
+def iter_lines(path):
+    """Yields the complete JSONL lines (as bytes) of an output, compressed or not."""
+    compression = compression_of(path)
+    with open(path, 'rb') as f:
+        if not compression:
+            yield from f
+            return
+        for frame_end, frame in iter_frames(f, compression):
+            yield from frame.splitlines(keepends=True)
+
+
+def patch_output(path, articles):
+    """Replaces the articles of an output that have the titles of `articles`, appends the others.
+
+    `articles` maps titles to articles. The output is rewritten into a new file
+    next to it (line by line, untouched articles are copied as they are) which
+    then takes its place; at every point in between either the old or the new
+    output is complete and the journal gets rebuilt from it if it's missing.
+    """
+    # cut off anything a crashed run left past the journal
+    ResumableOutput(path).close()
+
+    folder, name = os.path.split(path)
+    patched_path = os.path.join(folder, '.patch.' + name)
+    for leftover in (patched_path, patched_path + '.journal'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    articles = dict(articles)
+    patched = ResumableOutput(patched_path, sync=False)
+    for line in iter_lines(path):
+        title = ResumableOutput._title(line)
+        if title in articles:
+            patched.write(articles.pop(title))
+        else:
+            # lines that aren't articles (see _rebuild_journal()) are copied too
+            patched._add(line, title)
+    for article in articles.values():
+        patched.write(article)
+
+    patched.flush()
+    os.fsync(patched._out.fileno())
+    os.fsync(patched._journal.fileno())
+    patched.close()
+
+    os.remove(path + '.journal')
+    os.replace(patched_path, path)
+    os.replace(patched_path + '.journal', path + '.journal')
+
@@ -1,29 +1,78 @@
-import mwparserfromhell
 import re
 
-from bs4 import BeautifulSoup
+from itertools import islice
 
+# a comment or a <ref ...> opening, whichever comes first
+ref_open = re.compile(r'<!--|<ref(\s[^>]*)?>', re.IGNORECASE)
+# a comment or the </ref> closing the body
+ref_close = re.compile(r'<!--|</ref\s*>', re.IGNORECASE)
+# a url ends at whitespace, brackets, tags, template/parameter delimiters and quotes,
+# so bracketed links, bare links and citation template url= all come out clean
+url_pattern = re.compile(r'https?://[^\s\[\]<>{}|"]+', re.IGNORECASE)
+trailing_punctuation = ".,;:!?'"
 
-def ref_links(section_text):
-    # query = "(?<=<ref>)(.*?)(?=</ref>)"
-    # s = list(x.group() for x in re.finditer(query, str(section_text)))
 
-    soup = BeautifulSoup(str(section_text))
-    s=list(soup.findAll("ref"))
-    s=[str(x) for x in s]
+def skip_comment(text, pos):
+    # end of the comment starting before pos, an unclosed one runs to the end
+    end = text.find('-->', pos)
+    return len(text) if end == -1 else end + 3
 
-    finallist=[]
-    for i in s:
-        wikicode = mwparserfromhell.parse(i)
-        listoflinks = list(wikicode.filter_external_links())
-        for i in listoflinks:
-            # print(re.findall(r'(https?://[^\s]+)|(http?://[^\s]+)', str(i)))
-            try:
-                finallist.append(re.findall(r'(https?://[^\s]+)', str(i))[0]) #regex cleans url properly to send clean url
-            except:
-                pass
 
-    return finallist[:20]
+def ref_body(text, pos):
+    # the (start, end) spans of a ref body outside the comments in it, and where
+    # its </ref> ends; None if the ref is never closed
+    spans = []
+    while True:
+        closing = ref_close.search(text, pos)
+        if closing is None:
+            return None, None
+        spans.append((pos, closing.start()))
+        if closing.group() != '<!--':
+            return spans, closing.end()
+        pos = skip_comment(text, closing.end())
+
+
+def iter_ref_links(section_text):
+    # yields the urls found in the <ref> bodies of the text, in one scan of it;
+    # commented out refs and links don't count
+    text = str(section_text)
+    pos = 0
+    # where a search for a </ref> last came up empty, no later one can succeed
+    unclosed = len(text) + 1
+    while True:
+        opening = ref_open.search(text, pos)
+        if opening is None:
+            return
+        if opening.group() == '<!--':
+            pos = skip_comment(text, opening.end())
+            continue
+        # <ref name="x"/> only points to a ref defined elsewhere
+        if (opening.group(1) or '').rstrip().endswith('/'):
+            pos = opening.end()
+            continue
+
+        spans = None
+        if opening.end() < unclosed:
+            spans, body_end = ref_body(text, opening.end())
+        if spans is None:
+            # an unclosed <ref> has no body, the scan goes on after it
+            unclosed = min(unclosed, opening.end())
+            pos = opening.end()
+            continue
+
+        for start, end in spans:
+            for url in url_pattern.findall(text, start, end):
+                url = url.rstrip(trailing_punctuation)
+                if url.endswith(')') and '(' not in url:
+                    url = url[:-1]
+                yield url
+
+        pos = body_end
+
+
+def ref_links(section_text, limit=20):
+    # urls of the references of a section, the scan stops once `limit` are found
+    return list(islice(iter_ref_links(section_text), limit))
 
 
 # x= ref_links("""{{आज का आलेख}}{{सन्दूक यजुर्वेद}}
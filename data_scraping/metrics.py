@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds (in seconds) of the stage latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_str(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Metrics:
+    """In-process registry of scraper metrics, no service needed to record them.
+
+    - stage latencies go into fixed-bucket histograms (observe() / timer())
+    - counters for bytes, cache hits, failures per host etc. (inc())
+    - gauges for queue depths, the last and the highest value are kept (gauge())
+
+    flush() writes the lot as JSON and/or Prometheus text files and hands a flat
+    summary to the sinks (e.g. wandb_sink()), with every counter summed over its
+    labels: the breakdown per host, status... is only in the files. Worker
+    processes record into their own copy of the registry and send drain() back
+    to be merge()d by the parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+        self.sinks = []
+        self.json_path = None
+        self.prom_path = None
+        self._last_flush = time.monotonic()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+            hist['buckets'][bisect_left(BUCKETS, seconds)] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            last, highest = self._gauges.get(key, (value, value))
+            self._gauges[key] = (value, max(highest, value))
+
+    def drain(self):
+        """Returns what was recorded since the last drain() and resets it (for worker processes)."""
+        with self._lock:
+            data = {'stages': self._stages, 'counters': self._counters, 'gauges': self._gauges}
+            self._stages, self._counters, self._gauges = {}, {}, {}
+        return data
+
+    def merge(self, data):
+        with self._lock:
+            for stage, other in data['stages'].items():
+                hist = self._stages.setdefault(stage, {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+                hist['buckets'] = [a + b for a, b in zip(hist['buckets'], other['buckets'])]
+                hist['sum'] += other['sum']
+                hist['count'] += other['count']
+            for key, value in data['counters'].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (value, highest) in data['gauges'].items():
+                self._gauges[key] = (value, max(highest, self._gauges.get(key, (0, highest))[1]))
+
+    @staticmethod
+    def _quantile(hist, q):
+        # linear interpolation inside the bucket the quantile falls in
+        rank = q * hist['count']
+        seen = 0
+        for i, count in enumerate(hist['buckets']):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: dict(hist, buckets=list(hist['buckets'])) for stage, hist in self._stages.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        out = {'time': time.time(), 'stages': {}, 'counters': {}, 'gauges': {}}
+        for stage, hist in sorted(stages.items()):
+            out['stages'][stage] = {
+                'count': hist['count'],
+                'sum': round(hist['sum'], 6),
+                'mean': round(hist['sum'] / hist['count'], 6) if hist['count'] else 0.0,
+                'p50': round(self._quantile(hist, 0.5), 6),
+                'p90': round(self._quantile(hist, 0.9), 6),
+                'p99': round(self._quantile(hist, 0.99), 6),
+                'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], hist['buckets'])),
+            }
+        for (name, labels), value in sorted(counters.items()):
+            out['counters'][name + _label_str(labels)] = value
+        for (name, labels), (value, highest) in sorted(gauges.items()):
+            out['gauges'][name + _label_str(labels)] = {'last': value, 'max': highest}
+
+        return out
+
+    def to_prometheus(self, prefix='scraper_'):
+        with self._lock:
+            stages = {stage: dict(hist, buckets=list(hist['buckets'])) for stage, hist in self._stages.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = []
+        if stages:
+            lines.append(f'# TYPE {prefix}stage_seconds histogram')
+        for stage, hist in sorted(stages.items()):
+            label = (('stage', stage),)
+            cumulative = 0
+            for bound, count in zip([str(b) for b in BUCKETS] + ['+Inf'], hist['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}stage_seconds_bucket{_label_str(label, [("le", bound)])} {cumulative}')
+            lines.append(f'{prefix}stage_seconds_sum{_label_str(label)} {hist["sum"]}')
+            lines.append(f'{prefix}stage_seconds_count{_label_str(label)} {hist["count"]}')
+
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {prefix}{name}_total counter')
+                typed.add(name)
+            lines.append(f'{prefix}{name}_total{_label_str(labels)} {value}')
+        for (name, labels), (value, highest) in sorted(gauges.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {prefix}{name} gauge')
+                lines.append(f'# TYPE {prefix}{name}_max gauge')
+                typed.add(name)
+            lines.append(f'{prefix}{name}{_label_str(labels)} {value}')
+            lines.append(f'{prefix}{name}_max{_label_str(labels)} {highest}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export_to(self, json_path=None, prom_path=None):
+        """Files that flush() (re)writes."""
+        self.json_path = json_path
+        self.prom_path = prom_path
+
+    def flush(self, **extra):
+        """Writes the export files and passes the summary (plus `extra`) to the sinks."""
+        self._last_flush = time.monotonic()
+        snapshot = self.snapshot()
+        if self.json_path:
+            _write_atomic(self.json_path, json.dumps(snapshot, indent=1))
+        if self.prom_path:
+            _write_atomic(self.prom_path, self.to_prometheus())
+
+        if self.sinks:
+            flat = dict(extra)
+            for stage, summary in snapshot['stages'].items():
+                for stat in ('count', 'mean', 'p50', 'p90', 'p99'):
+                    flat[f'{stage}/{stat}'] = summary[stat]
+            # one key per counter name, a key per host would grow with every host met
+            with self._lock:
+                counters = list(self._counters.items())
+            for (name, labels), value in counters:
+                flat[name] = flat.get(name, 0) + value
+            flat.update({name: gauge['last'] for name, gauge in snapshot['gauges'].items()})
+            for sink in self.sinks:
+                sink(flat)
+
+    def maybe_flush(self, interval=30, **extra):
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush(**extra)
+
+
+def _write_atomic(path, text):
+    # readers (e.g. a node exporter textfile collector) never see half a file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def wandb_sink(**init_kwargs):
+    """A sink logging the summaries to wandb, None if wandb is not installed."""
+    try:
+        import wandb
+    except ImportError:
+        print("wandb is not installed, metrics are only written locally")
+        return None
+
+    wandb.init(**init_kwargs)
+    return wandb.log
+
+
+# the registry of this process
+metrics = Metrics()
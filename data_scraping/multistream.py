@@ -0,0 +1,196 @@
+import bz2
+import os
+import queue
+
+from collections import deque
+from itertools import islice
+import multiprocessing
+
+from dump_reader import iter_pages
+from metrics import metrics
+
+# every bz2 stream starts with the file header ('BZh' + block size) directly
+# followed by the byte aligned magic of its first block
+STREAM_MAGIC = b'1AY&SY'
+READ_SIZE = 1 << 22
+
+# title allow-list of the pool workers, set once by init_worker()
+worker_titles = None
+
+
+def stream_offsets(dump_path):
+    """Yields the byte offsets at which the bz2 streams of a multistream dump start."""
+    size = os.path.getsize(dump_path)
+
+    with open(dump_path, 'rb') as dump:
+        position = 0
+        # keep the tail of the previous read so headers across reads are found
+        tail = b''
+        while position < size:
+            data = tail + dump.read(READ_SIZE)
+            base = position - len(tail)
+
+            start = 0
+            while True:
+                found = data.find(b'BZh', start)
+                if found == -1 or found + 10 > len(data):
+                    break
+                if data[found + 3] in b'123456789' and data[found + 4:found + 10] == STREAM_MAGIC:
+                    yield base + found
+                start = found + 1
+
+            position += READ_SIZE
+            tail = data[-9:]
+
+
+def stream_spans(dump_path, offsets=None):
+    """Pairs up consecutive stream offsets into (start, end) byte spans."""
+    if offsets is None:
+        offsets = stream_offsets(dump_path)
+
+    previous = None
+    for offset in offsets:
+        if previous is not None:
+            yield previous, offset
+        previous = offset
+
+    if previous is not None:
+        yield previous, os.path.getsize(dump_path)
+
+
+def read_index(index_path):
+    """Yields (offset, page id, title) from a multistream index file.
+
+    Every line of the index looks like `offset:page_id:title`, the offset being
+    the position of the bz2 stream holding the page.
+    """
+    opener = bz2.open if index_path.endswith('.bz2') else open
+    with opener(index_path, 'rt', encoding='utf-8') as index:
+        for line in index:
+            offset, page_id, title = line.rstrip('\n').split(':', 2)
+            yield int(offset), page_id, title
+
+
+def target_spans(dump_path, index_path, titles):
+    """Works out the byte spans of the streams that hold any of the given titles."""
+    offsets = []
+    targets = set()
+    for offset, _, title in read_index(index_path):
+        if not offsets or offsets[-1] != offset:
+            offsets.append(offset)
+        if title in titles:
+            targets.add(offset)
+
+    # a stream ends where the next one in the index starts
+    ends = dict(zip(offsets, offsets[1:] + [os.path.getsize(dump_path)]))
+
+    return [(offset, ends[offset]) for offset in sorted(targets)]
+
+
+def decompress_span(dump_path, start, end):
+    """Decompresses the bz2 stream(s) starting between `start` and `end`.
+
+    A span that turns out to be cut in the middle of a stream keeps reading past
+    `end` until that stream is complete, and stops there (the streams after it
+    belong to the next spans); a span that does not start on a real stream
+    header (a chance match of the magic bytes) decodes to nothing.
+    """
+    out = []
+    with open(dump_path, 'rb') as dump:
+        dump.seek(start)
+        data = dump.read(end - start)
+        decompressor = bz2.BZ2Decompressor()
+
+        try:
+            while data:
+                out.append(decompressor.decompress(data))
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    # where the stream that just ended stops in the file
+                    if dump.tell() - len(data) >= end:
+                        break
+                    if data:
+                        decompressor = bz2.BZ2Decompressor()
+                elif dump.tell() < os.fstat(dump.fileno()).st_size:
+                    data = dump.read(READ_SIZE)
+                else:
+                    data = b''
+        except OSError:
+            if not out:
+                return b''
+
+    return b''.join(out)
+
+
+def init_worker(titles):
+    global worker_titles
+    worker_titles = titles
+
+
+def parse_span(span):
+    """Decompresses one span of the dump and parses the pages inside it."""
+    dump_path, start, end = span
+    with metrics.timer('decompress'):
+        chunk = decompress_span(dump_path, start, end)
+    metrics.inc('dump_bytes', len(chunk))
+
+    # drop the <mediawiki>/<siteinfo> header and the closing tag that the
+    # first and last streams carry, and give the pages a common root
+    first = chunk.find(b'<page>')
+    last = chunk.rfind(b'</page>')
+    if first == -1 or last == -1:
+        return [], metrics.drain()
+
+    lines = [b'<pages>', chunk[first:last + len(b'</page>')], b'</pages>']
+    pages = list(iter_pages(lines, worker_titles))
+    # what this worker recorded goes back with the pages
+    return pages, metrics.drain()
+
+
+def read_multistream(dump_path, processes=None, ordered=True, spans=None, titles=None, window=None):
+    """Yields the pages of a multistream dump, decompressed and parsed in a process pool.
+
+    With ordered=False the pages are handed out as soon as a stream is done,
+    which keeps all workers busy but gives up the dump order. `titles` is an
+    optional allow-list, handed to every worker once. At most `window` spans
+    (twice the processes by default) are being decompressed or waiting to be
+    consumed at once, so a slow consumer holds the workers back instead of
+    the parsed pages piling up in memory.
+    """
+    if spans is None:
+        spans = stream_spans(dump_path)
+    tasks = ((dump_path, start, end) for start, end in spans)
+    if window is None:
+        window = 2 * (processes or os.cpu_count())
+
+    # the pool is made by whichever thread reads the pages (e.g. scrape_pages()'s
+    # reader) while others run, so its workers come from a forkserver instead
+    # of a fork holding their locks
+    context = multiprocessing.get_context('forkserver')
+    with context.Pool(processes=processes, initializer=init_worker, initargs=(titles,)) as pool:
+        # ordered: the results in submission order; unordered: as they finish
+        pending = deque()
+        finished = queue.Queue()
+
+        def submit():
+            for task in islice(tasks, window - len(pending)):
+                if ordered:
+                    pending.append(pool.apply_async(parse_span, (task,)))
+                else:
+                    pending.append(None)
+                    pool.apply_async(parse_span, (task,), callback=finished.put, error_callback=finished.put)
+
+        submit()
+        while pending:
+            if ordered:
+                result = pending.popleft().get()
+            else:
+                pending.pop()
+                result = finished.get()
+                if isinstance(result, BaseException):
+                    raise result
+            pages, recorded = result
+            metrics.merge(recorded)
+            yield from pages
+            # only refilled once the pages of a span have been taken
+            submit()
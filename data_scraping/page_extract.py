@@ -3,16 +3,10 @@ import xml.sax
 import re
 import mwparserfromhell
 
-def page_extract(xml_input):
-    query="<page>(.*?)</page>"
-    pages = re.findall(query, str(xml_input), re.DOTALL)
-
-    return pages
-
 def intro_extract(page_text):
-
+    # page_text is the wikitext of the page, the intro is all before the first heading
     try:
-        query = "<text>(.*?)==[^>]+=="
+        query = "^(.*?)==[^>]+=="
         x = re.findall(query, str(page_text), re.DOTALL)[0]
         return x
     except Exception as e:
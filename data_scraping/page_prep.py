@@ -0,0 +1,61 @@
+import time
+
+from metrics import metrics
+from extract_sections import section_extraction
+from page_extract import intro_extract
+from preprocessing import strip_metadata
+from section_processing import parse_section, relevant_indices, finish_section
+
+# the CPU bound part of scraping a page: no network, no files, nothing done at
+# import time, so that it can run in worker processes (see scrape_pipeline.py);
+# timings go to the worker's own metrics, sent back by scrape_pipeline
+
+
+def pipeline(page):
+    with metrics.timer('wikitext_parse'):
+        sections, main_section_names = section_extraction(page.wikitext)
+
+        # every section is parsed once, its length, cleaned text and links all come from that parse
+        parsed = [parse_section(section[0]) for section in sections]
+
+    # lets scrape only the relevant sections, i.e. having word count>=avg of all sections:
+    output = []
+    with metrics.timer('cleaning'):
+        for i in relevant_indices(parsed):
+            content, links = finish_section(parsed[i])
+            # links are scraped for the whole page at once, after parsing
+            output.append({'title': main_section_names[i].strip(), 'content': content, 'links': links})
+
+    return output
+
+
+def intro_data(page):
+    intro = intro_extract(page.wikitext)
+    with metrics.timer('wikitext_parse'):
+        parsed = parse_section(intro)
+    with metrics.timer('cleaning'):
+        clean_intro, refs = finish_section(parsed)
+
+    out = {
+        "title": "Introduction",
+        "content": clean_intro,
+        "links": refs
+    }
+
+    return out
+
+
+def prepare_page(page):
+    """Parses and cleans a page, its sections still hold the 'links' to scrape."""
+    start = time.process_time()
+    # metadata tags are removed from the whole page once, not per section
+    with metrics.timer('strip_metadata'):
+        page = page._replace(wikitext=strip_metadata(page.wikitext))
+    intro = intro_data(page)
+    op = pipeline(page)
+    op.insert(0, intro)
+    # CPU time for parsing and cleaning
+    metrics.observe('prepare_page_cpu', time.process_time() - start)
+
+    return {"title": page.title, "sections": op}
+
@@ -1,7 +1,6 @@
 # cleaning sectional text by removing certain tags and templates:
 
 import re
-import mwparserfromhell
 from bs4 import BeautifulSoup
 
 
@@ -30,81 +29,57 @@ def strip_html_tags(text):
 
 
 
-def remove_templates(section_text):
-    filtered_section = []
+# MediaWiki metadata tags that get removed along with their content (of no use from nlp standpoint)
+METADATA_TAGS = ['format', 'contributor', 'timestamp', 'ns', 'id', 'parentid', 'ip', 'comment', 'model', 'sha1']
+metadata_open = re.compile('<(' + '|'.join(METADATA_TAGS) + ')>')
 
-    for i in range(len(section_text)):
-        try:
-            temp = mwparserfromhell.parse(section_text[i])
 
-            # get list of all templates in the section which we'll remove:
-            template_list = temp.filter_templates()
-
-            # removing the unnecessary tags and the content in them (of no use from nlp standpoint):
-            temp = re.sub(
-                '(<format>((.|\n)*?)</format>)|(<contributor>((.|\n)*?)</contributor>)|(<timestamp>((.|\n)*?)</timestamp>)|(<ns>((.|\n)*?)</ns>)|(<id>((.|\n)*?)</id>)|(<parentid>((.|\n)*?)</parentid>)|(<ip>((.|\n)*?)</ip>)|(<comment>((.|\n)*?)</comment>|(<model>((.|\n)*?)</model>|(<sha1>((.|\n)*?)</sha1>)))',
-                '', str(temp))
-
-            temp = mwparserfromhell.parse(temp)
-            # using the strip_code method to remove unnecessary attributes:
-            temp = temp.strip_code().strip()
-
-            # converting to string as operations are easier to perform:
-            temp = str(temp)
-
-            for j in template_list:
-                temp = temp.replace(str(j), '')
-
-                # remove excess \n occurences also if needed:
-                temp = temp.replace('\n', ' ')
-
-                # print("Cleaned temp:\n",temp)
-                # remove excess spacings also:
-                temp = re.sub(r'\s\s+', ' ',temp)
-                # print("Throrughly Cleaned temp:\n", temp)
-
-                temp=strip_html_tags(temp)
-                temp = re.sub(r'\s\s+', ' ', temp)
-
-            # Removing all html tags present using strip_html_tags() defined earlier:
-            filtered_section.append(temp)
-
-        except Exception as e:
-            print(e)
-
-    return filtered_section
-
-
-def cleaning(page_text):
-    temp = mwparserfromhell.parse(page_text)
-
-    # get list of all templates in the section which we'll remove:
-    template_list = temp.filter_templates()
-
-    # removing the unnecessary tags and the content in them (of no use from nlp standpoint):
-    temp = re.sub(
-        '(<format>((.|\n)*?)</format>)|(<contributor>((.|\n)*?)</contributor>)|(<timestamp>((.|\n)*?)</timestamp>)|(<ns>((.|\n)*?)</ns>)|(<id>((.|\n)*?)</id>)|(<parentid>((.|\n)*?)</parentid>)|(<ip>((.|\n)*?)</ip>)|(<comment>((.|\n)*?)</comment>|(<model>((.|\n)*?)</model>|(<sha1>((.|\n)*?)</sha1>)))',
-        '', str(temp))
-
-    temp = mwparserfromhell.parse(temp)
-    # using the strip_code method to remove unnecessary attributes:
-    temp = temp.strip_code().strip()
-
-    # converting to string as operations are easier to perform:
-    temp = str(temp)
+def strip_metadata(text):
+    """
+    Removes the metadata tags and their content from the text, in linear time.
 
+    Every opening tag is matched with the first closing tag after it (like the
+    old lazy regex did), and the scan carries on after that closing tag, so no
+    part of the text is looked at twice. A tag without a closing tag is kept.
+    """
+    text = str(text)
+    out = []
+    pos = 0
+    # tags with no closing tag left in the rest of the text
+    unclosed = set()
+
+    while True:
+        match = metadata_open.search(text, pos)
+        if match is None:
+            break
+
+        tag = match.group(1)
+        end = -1 if tag in unclosed else text.find('</' + tag + '>', match.end())
+        if end == -1:
+            unclosed.add(tag)
+            out.append(text[pos:match.end()])
+            pos = match.end()
+            continue
+
+        out.append(text[pos:match.start()])
+        pos = end + len(tag) + 3
+
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def clean_stripped(temp, template_list):
+    # cleaning the strip_code() output of a section whose templates were template_list
     for j in template_list:
         temp = temp.replace(str(j), '')
 
-        # remove excess \n occurences also if needed:
-        temp = temp.replace('\n', ' ')
-
-        # print("Cleaned temp:\n",temp)
-        # remove excess spacings also:
-        temp = re.sub(r'\s\s+', ' ', temp)
-        # print("Throrughly Cleaned temp:\n", temp)
+    # remove excess \n occurences also if needed:
+    temp = temp.replace('\n', ' ')
+    # remove excess spacings also:
+    temp = re.sub(r'\s\s+', ' ', temp)
 
-        temp = strip_html_tags(temp)
-        temp = re.sub(r'\s\s+', ' ', temp)
+    # Removing all html tags present using strip_html_tags() defined earlier:
+    temp = strip_html_tags(temp)
+    temp = re.sub(r'\s\s+', ' ', temp)
 
-    return temp
\ No newline at end of file
+    return temp
@@ -0,0 +1,125 @@
+import time
+import sqlite3
+import threading
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def normalize_url(url):
+    """Lower-cases scheme and host, drops default ports and fragments and sorts the query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if scheme in DEFAULT_PORTS and netloc.endswith(DEFAULT_PORTS[scheme]):
+        netloc = netloc[:-len(DEFAULT_PORTS[scheme])]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+class ReferenceCache:
+    """On-disk cache of scraped reference text, keyed by normalized url.
+
+    Entries older than `ttl` seconds are stale: they are revalidated with their
+    ETag/Last-Modified when they have one and refetched otherwise. Once the
+    stored text goes over `max_bytes` the least recently used entries are evicted.
+    Reads don't write: the access times of read entries are kept in memory and
+    written along with the next put() (or every `access_batch` reads).
+    """
+
+    def __init__(self, path='reference_cache.sqlite', max_bytes=2 << 30, ttl=30 * 24 * 3600, access_batch=1000):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.access_batch = access_batch
+        self._lock = threading.Lock()
+        # normalized url -> time it was last read, not written yet
+        self._accessed = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # the cache can lose its last writes in a power cut, it can't get corrupted
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS refs (
+            url TEXT PRIMARY KEY,
+            text TEXT,
+            content_type TEXT,
+            status INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL,
+            last_access REAL,
+            size INTEGER)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS refs_last_access ON refs (last_access)')
+        self._db.commit()
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM refs').fetchone()[0]
+
+    def get(self, url):
+        """Returns the cached entry of a url as a dict, or None."""
+        key = normalize_url(url)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT text, content_type, status, etag, last_modified, fetched_at FROM refs WHERE url = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.access_batch:
+                self._write_accesses()
+                self._db.commit()
+
+        keys = ['text', 'content_type', 'status', 'etag', 'last_modified', 'fetched_at']
+        return dict(zip(keys, row))
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def put(self, url, text, content_type=None, status=200, etag=None, last_modified=None):
+        now = time.time()
+        size = len(text.encode('utf-8'))
+        key = normalize_url(url)
+
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._write_accesses()
+            old = self._db.execute('SELECT size FROM refs WHERE url = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (key, text, content_type, status, etag, last_modified, now, now, size))
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def revalidated(self, url):
+        """The server answered 304 Not Modified: the entry is fresh again."""
+        with self._lock:
+            now = time.time()
+            self._accessed.pop(normalize_url(url), None)
+            self._db.execute('UPDATE refs SET fetched_at = ?, last_access = ? WHERE url = ?',
+                             (now, now, normalize_url(url)))
+            self._db.commit()
+
+    def _write_accesses(self):
+        if self._accessed:
+            self._db.executemany('UPDATE refs SET last_access = ? WHERE url = ?',
+                                 [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed = {}
+
+    def _evict(self):
+        # drop least recently used entries until we are 10% under the cap
+        target = self.max_bytes * 0.9
+        rows = self._db.execute('SELECT url, size FROM refs ORDER BY last_access')
+        evicted = []
+        for url, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((url,))
+            self._size -= size
+        rows.close()
+        self._db.executemany('DELETE FROM refs WHERE url = ?', evicted)
+
+    def close(self):
+        with self._lock:
+            self._write_accesses()
+            self._db.commit()
+            self._db.close()
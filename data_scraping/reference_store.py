@@ -0,0 +1,73 @@
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+
+def reference_id(text):
+    """Content hash of a reference text, the id articles refer to it by."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class ReferenceStore:
+    """Reference texts stored once each, keyed by the hash of their content.
+
+    Articles written with a store keep a 'reference_ids' list per section (None
+    where nothing could be scraped) instead of the texts themselves, so a
+    document cited by many sections, pages or languages is stored once, and
+    readers that only want the outlines never load any reference text.
+    references() / resolve() look the texts up when they are actually needed.
+    Texts are kept zlib compressed.
+    """
+
+    def __init__(self, path='references.sqlite'):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS refs (id TEXT PRIMARY KEY, text BLOB)')
+        self._db.commit()
+
+    def put_many(self, texts):
+        """Stores texts (once each) and returns their ids, committed before returning."""
+        ids = [reference_id(text) if text else None for text in texts]
+        rows = [(ref_id, zlib.compress(text.encode('utf-8')))
+                for ref_id, text in zip(ids, texts) if ref_id is not None]
+        with self._lock:
+            self._db.executemany('INSERT OR IGNORE INTO refs VALUES (?, ?)', rows)
+            self._db.commit()
+
+        return ids
+
+    def get_many(self, ids):
+        """Texts of the given ids, '' for None or an unknown id."""
+        wanted = list({ref_id for ref_id in ids if ref_id is not None})
+        found = {}
+        with self._lock:
+            # sqlite caps the number of parameters of a query
+            for i in range(0, len(wanted), 500):
+                batch = wanted[i:i + 500]
+                query = 'SELECT id, text FROM refs WHERE id IN (%s)' % ','.join('?' * len(batch))
+                found.update(self._db.execute(query, batch).fetchall())
+
+        return [zlib.decompress(found[ref_id]).decode('utf-8') if ref_id in found else ''
+                for ref_id in ids]
+
+    def references(self, section):
+        """The reference texts of a section, written with or without a store."""
+        if 'references' in section:
+            return section['references']
+        return self.get_many(section.get('reference_ids', []))
+
+    def resolve(self, article):
+        """Fills in the 'references' of every section of an article (in place)."""
+        for section in article['sections']:
+            if 'references' not in section:
+                section['references'] = self.references(section)
+                section.pop('reference_ids', None)
+
+        return article
+
+    def close(self):
+        with self._lock:
+            self._db.close()
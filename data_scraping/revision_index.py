@@ -0,0 +1,59 @@
+import os
+import json
+
+
+def newer(revision, than):
+    """Whether a revision id is newer than another one (None or '' being the oldest)."""
+    if not revision:
+        return False
+    return not than or int(revision) > int(than)
+
+
+class RevisionIndex:
+    """The revision id each article of an output was extracted from.
+
+    Kept next to the output in `<path>.revisions` as `revision\\ttitle` lines,
+    appended as articles are written (a later line for a title wins). An
+    incremental run only re-extracts the pages of an adds/changes dump whose
+    revision is newer than the recorded one; a page without a recorded
+    revision always counts as changed.
+    """
+
+    def __init__(self, path):
+        self.path = path + '.revisions'
+        self._revisions = {}
+        valid = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('partial revision line')
+                        revision, title = line.decode('utf-8').rstrip('\n').split('\t', 1)
+                        self._revisions[json.loads(title)] = revision
+                    except ValueError:
+                        break
+                    valid += len(line)
+
+            # drop a line cut short by a crash, so the next one doesn't get appended to it
+            if valid < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid)
+
+        self._file = open(self.path, 'ab')
+
+    def get(self, title):
+        return self._revisions.get(title)
+
+    def changed(self, title, revision):
+        return not revision or newer(revision, self._revisions.get(title))
+
+    def record(self, title, revision):
+        if not revision or not newer(revision, self._revisions.get(title)):
+            return
+        self._revisions[title] = revision
+        self._file.write(f'{revision}\t{json.dumps(title, ensure_ascii=False)}\n'.encode('utf-8'))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,238 @@
+# Scrapes many language/domain pairs in one process, from a manifest:
+#   python3 scheduler.py <manifest.json>
+import os
+import sys
+import json
+import queue
+import threading
+
+from scrape_pipeline import scrape_pages, STOP
+from fetcher import Fetcher
+from reference_cache import ReferenceCache
+from reference_store import ReferenceStore
+from journal import ResumableOutput, SUFFIXES, patch_output
+from revision_index import RevisionIndex, newer
+
+from dump_reader import read_dump, read_domain_pages
+from multistream import read_multistream, target_spans
+from domain_index import build_title_index, normalize_title
+from metrics import metrics, wandb_sink
+
+
+def load_sources(manifest, data, existing_titles):
+    """One source per dump (or domain-wise xml) of the manifest, with the pairs it feeds.
+
+    A dump is read once for all the domains of its language that are listed with
+    it; each pair gets its own output (shared by all the sources listing the
+    pair), skipping what is in it already and what is in existing_titles.json.
+
+    A source marked "incremental" is an adds/changes dump: the pages of its
+    pairs (listed in final_titles.json or already in the output) are extracted
+    again if their revision is newer than the one written, and patched into
+    the output at the end of the run. The mode belongs to the source, a pair
+    can be fed by a full dump and by adds/changes dumps in the same run.
+    """
+    output_dir = manifest.get('output_dir', './')
+    suffix = '.json' + SUFFIXES.get(manifest.get('compression'), '')
+
+    jobs = {}
+    sources = []
+    for entry in manifest['sources']:
+        lang = entry['lang']
+        domains = entry.get('domains') or [entry['domain']]
+
+        source_jobs = []
+        for domain in domains:
+            name = f'{lang}_{domain}'
+            if name not in jobs:
+                path = f'{output_dir}{name}{suffix}'
+                titles = set(build_title_index({domain: data[domain]}, lang))
+                done = existing_titles.get(lang, {}).get(domain, [])
+                outfile = ResumableOutput(path, done=done)
+
+                jobs[name] = {'name': name, 'path': path, 'outfile': outfile,
+                              'titles': titles - {normalize_title(title) for title in done},
+                              # the pages already in the output are the ones to keep up to date
+                              'incremental_titles': titles | {normalize_title(title) for title in outfile.titles},
+                              'revisions': RevisionIndex(path), 'written': {}, 'updates': {}}
+            source_jobs.append(jobs[name])
+
+        sources.append(dict(entry, jobs=source_jobs, incremental=entry.get('incremental', False)))
+
+    return sources, list(jobs.values())
+
+
+def wants(job, page, incremental):
+    if incremental:
+        return job['revisions'].changed(page.title, page.revision)
+    return page.title not in job['outfile']
+
+
+def source_pages(source):
+    """Yields ((jobs still wanting the page, its revision, incremental), page) for the pages of one source."""
+    jobs = source['jobs']
+    incremental = source['incremental']
+
+    if 'xml' in source:
+        # a domain-wise xml only holds pages of its domain
+        for page in read_domain_pages(source['xml']):
+            wanting = [job for job in jobs if wants(job, page, incremental)]
+            if wanting:
+                yield (wanting, page.revision, incremental), page
+        return
+
+    title_index = {}
+    for job in jobs:
+        for title in job['incremental_titles' if incremental else 'titles']:
+            title_index.setdefault(title, []).append(job)
+
+    processes = source.get('processes', 0)
+    if source.get('index'):
+        spans = target_spans(source['dump'], source['index'], title_index)
+        pages = read_multistream(source['dump'], processes=processes or 1, ordered=False, spans=spans,
+                                 titles=title_index)
+    elif processes:
+        pages = read_multistream(source['dump'], processes=processes, ordered=False, titles=title_index)
+    else:
+        pages = read_dump(source['dump'], titles=title_index)
+
+    for page in pages:
+        wanting = [job for job in title_index.get(normalize_title(page.title), ()) if wants(job, page, incremental)]
+        if wanting:
+            yield (wanting, page.revision, incremental), page
+
+
+def read_sources(sources, depth=256):
+    """Yields the (tag, page) pairs of all the sources as they come.
+
+    Every source is read by its own thread into one bounded queue, so a source
+    that has to scan a whole dump for its next page doesn't hold the others up
+    and the ones still going keep the pipeline full once the others are done.
+    """
+    items = queue.Queue(depth)
+    stopping = threading.Event()
+    errors = []
+
+    def put(item):
+        # gives up once the consumer has stopped iterating
+        while not stopping.is_set():
+            try:
+                items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(source):
+        pages = source_pages(source)
+        try:
+            for item in pages:
+                if not put(item):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pages.close()
+            put(STOP)
+
+    threads = [threading.Thread(target=read, args=(source,), daemon=True) for source in sources]
+    for thread in threads:
+        thread.start()
+
+    try:
+        finished = 0
+        while finished < len(threads):
+            item = items.get()
+            if item is STOP:
+                finished += 1
+                continue
+            yield item
+
+        if errors:
+            raise errors[0]
+
+    finally:
+        # also reached when the caller stops iterating early
+        stopping.set()
+
+
+def share_processes(sources, budget):
+    """Splits one budget of decompression processes between the multistream sources.
+
+    A source's own "processes" is kept as an upper bound of its share.
+    """
+    readers = [source for source in sources if 'dump' in source
+               and (source.get('index') or source.get('processes'))]
+    if not readers:
+        return
+    share = max(1, budget // len(readers))
+    for source in readers:
+        source['processes'] = min(source.get('processes') or share, share)
+
+
+def run(manifest):
+    data = json.load(open(manifest.get('final_titles', 'final_titles.json'), 'r'))
+    existing_titles = json.load(open(manifest.get('existing_titles', 'existing_titles.json'), 'r'))
+    output_dir = manifest.get('output_dir', './')
+
+    metrics.export_to(json_path=f'{output_dir}scheduler.metrics.json', prom_path=f'{output_dir}scheduler.metrics.prom')
+    if os.environ.get('USE_WANDB'):
+        sink = wandb_sink(project='outlinetastic', name='scheduler')
+        if sink is not None:
+            metrics.sinks.append(sink)
+
+    # one connection pool, reference cache and store, and one set of parsing
+    # processes and fetch threads for all the pairs
+    fetcher = Fetcher(max_connections=manifest.get('connections', 15),
+                      cache=ReferenceCache(manifest.get('cache', 'reference_cache.sqlite')))
+    store = ReferenceStore(f'{output_dir}references.sqlite')
+    sources, jobs = load_sources(manifest, data, existing_titles)
+    share_processes(sources, manifest.get('read_processes') or os.cpu_count())
+
+    pages = read_sources(sources)
+    written = 0
+    for (wanting, revision, incremental), article in scrape_pages(pages, fetcher, manifest.get('parse_processes'),
+                                                                  manifest.get('fetch_threads', 8),
+                                                                  window=manifest.get('window', 128),
+                                                                  ordered=False, store=store, tagged=True):
+        title = article['title']
+        for job in wanting:
+            # the sources are read concurrently and pages finish in any order: a
+            # revision older than one already taken for the title (e.g. from
+            # another adds/changes dump) is dropped
+            if title in job['written'] and not newer(revision, job['written'][title]):
+                continue
+            if incremental or title in job['outfile']:
+                # patched in at the end (a full dump's page can also be newer than
+                # the one an adds/changes dump already put in the output)
+                job['updates'][title] = article
+            else:
+                job['outfile'].write(article)
+                # a pending older update of the title would undo this one
+                job['updates'].pop(title, None)
+            job['written'][title] = revision
+            metrics.inc('pages_written', job=job['name'])
+
+        written += 1
+        print("Page no.", written, article['title'], [job['name'] for job in wanting])
+        metrics.maybe_flush(**{'page number': written})
+
+    for job in jobs:
+        job['outfile'].close()
+        if job['updates']:
+            print(f"Patching {len(job['updates'])} articles into {job['path']}")
+            with metrics.timer('patch_output'):
+                patch_output(job['path'], job['updates'])
+        # revisions are only recorded once their articles are safely in the
+        # output, a crash before that just means they count as changed next time
+        for title, revision in job['written'].items():
+            job['revisions'].record(title, revision)
+        job['revisions'].close()
+    fetcher.close()
+    fetcher.cache.close()
+    store.close()
+    metrics.flush()
+
+
+if __name__ == '__main__':
+    run(json.load(open(sys.argv[1], 'r')))
@@ -0,0 +1,159 @@
+import queue
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import metrics
+from page_prep import prepare_page
+
+# end of stream marker passed down the stage queues
+STOP = object()
+
+
+def parse_in_worker(page):
+    # the timings recorded in the worker go back along with the article
+    return prepare_page(page), metrics.drain()
+
+
+def add_references(article, fetcher, store=None):
+    # all references of the page are fetched concurrently over the shared pool
+    references = fetcher.scrape_many([section.pop('links') for section in article['sections']])
+    for section, refs in zip(article['sections'], references):
+        if store is None:
+            section['references'] = refs
+        else:
+            # the texts go to the ReferenceStore (before the article is written), the article keeps their ids
+            section['reference_ids'] = store.put_many(refs)
+
+    return article
+
+
+def scrape_pages(pages, fetcher, parse_processes=None, fetch_threads=4, window=64, ordered=True, store=None,
+                 tagged=False):
+    """Scrapes pages in a staged pipeline and yields the finished articles.
+
+    Stages, connected by bounded queues:
+    1. a thread reads the pages from `pages` (e.g. read_domain_pages() or read_dump())
+    2. `parse_processes` worker processes parse and clean them (page_prep.prepare_page)
+    3. `fetch_threads` threads fetch the references of one page each over `fetcher`
+       (into `store` if given, see add_references())
+    4. the caller writes what is yielded, in page order if `ordered`, else as finished
+
+    At most `window` pages are anywhere in the pipeline at once, so a slow stage
+    (or a slow consumer) holds the reading back instead of piling pages up. A
+    page that fails to parse or fetch is printed and left out, but a parse
+    worker dying raises BrokenProcessPool once the pages before it are out.
+
+    With `tagged`, `pages` holds (tag, page) pairs and (tag, article) pairs are
+    yielded, e.g. to tell which output an article goes to.
+    """
+    parse_q = queue.Queue(window)
+    fetch_q = queue.Queue(window)
+    done_q = queue.Queue()
+    in_flight = threading.Semaphore(window)
+    stopping = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            for i, item in enumerate(pages):
+                tag, page = item if tagged else (None, item)
+                in_flight.acquire()
+                if stopping.is_set():
+                    return
+                parse_q.put((i, tag, page))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            parse_q.put(STOP)
+
+    def fail(e):
+        # a dead worker process (killed for memory, a crash in a C extension)
+        # breaks the pool: the run stops instead of dropping every page after it
+        errors.append(e)
+        stopping.set()
+
+    def parse(pool):
+        # futures go down in page order, the fetch threads wait on them
+        try:
+            for i, tag, page in iter(parse_q.get, STOP):
+                fetch_q.put((i, tag, page.title, pool.submit(parse_in_worker, page)))
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(fetch_threads):
+                fetch_q.put(STOP)
+
+    def fetch():
+        try:
+            for i, tag, title, future in iter(fetch_q.get, STOP):
+                try:
+                    # time blocked here means parsing is what holds the pipeline up
+                    with metrics.timer('parse_wait'):
+                        article, recorded = future.result()
+                    metrics.merge(recorded)
+                    if not stopping.is_set():
+                        with metrics.timer('page_fetch'):
+                            article = add_references(article, fetcher, store)
+                except BrokenProcessPool as e:
+                    fail(e)
+                    article = None
+                except Exception as e:
+                    print("Failed to scrape", title, ":", e)
+                    metrics.inc('pages_failed')
+                    article = None
+                done_q.put((i, tag, article))
+        finally:
+            done_q.put(STOP)
+
+    # the workers are started once the threads run, so by a forkserver rather
+    # than forked with whatever locks the threads hold (the script has to
+    # guard its run with `if __name__ == '__main__'`)
+    pool = ProcessPoolExecutor(parse_processes, mp_context=multiprocessing.get_context('forkserver'))
+    threads = [threading.Thread(target=read, daemon=True),
+               threading.Thread(target=parse, args=(pool,), daemon=True)]
+    threads += [threading.Thread(target=fetch, daemon=True) for _ in range(fetch_threads)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        finished = 0
+        next_i = 0
+        pending = {}
+        while finished < fetch_threads:
+            with metrics.timer('writer_wait'):
+                item = done_q.get()
+            metrics.gauge('queue_depth', parse_q.qsize(), queue='parse')
+            metrics.gauge('queue_depth', fetch_q.qsize(), queue='fetch')
+            metrics.gauge('queue_depth', done_q.qsize(), queue='done')
+            metrics.gauge('queue_depth', len(pending), queue='reorder')
+            if item is STOP:
+                finished += 1
+                continue
+
+            i, tag, article = item
+            pending[i] = (tag, article)
+            # a page's slot is freed once it's handed to the caller
+            while pending:
+                if not ordered:
+                    tag, article = pending.popitem()[1]
+                elif next_i in pending:
+                    tag, article = pending.pop(next_i)
+                    next_i += 1
+                else:
+                    break
+                in_flight.release()
+                if article is not None:
+                    yield (tag, article) if tagged else article
+
+        if errors:
+            raise errors[0]
+
+    finally:
+        # also reached when the caller stops iterating early
+        stopping.set()
+        for _ in range(window):
+            in_flight.release()
+        pool.shutdown(wait=False, cancel_futures=True)
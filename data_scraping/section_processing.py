@@ -0,0 +1,30 @@
+import mwparserfromhell
+
+from preprocessing import clean_stripped
+from link_extraction import ref_links
+
+
+def parse_section(text):
+    # the one and only wikitext parse of a section, everything else is derived from it
+    # (metadata tags are stripped once per page beforehand, see strip_metadata())
+    wikicode = mwparserfromhell.parse(text)
+    stripped = wikicode.strip_code().strip()
+
+    return {'text': text, 'wikicode': wikicode, 'stripped': stripped, 'length': len(stripped)}
+
+
+def relevant_indices(sections):
+    # only consider those sections with character-count>= average
+    if len(sections) == 0:
+        return []
+    avglen = sum(section['length'] for section in sections) // len(sections)
+
+    return [i for i, section in enumerate(sections) if section['length'] >= avglen]
+
+
+def finish_section(section):
+    # cleaned text and reference links of a parsed section
+    wikicode = section['wikicode']
+    content = clean_stripped(section['stripped'], wikicode.filter_templates())
+
+    return content, ref_links(section['text'])
@@ -1,3 +1,4 @@
+import re
 import urllib
 from urllib.request import Request, urlopen
 import wikipedia
@@ -7,13 +8,11 @@ import requests
 from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfparser import PDFParser
 from tqdm import tqdm
-from bs4 import BeautifulSoup
-# from PyPDF2 import PdfFileReader
+from lxml import etree
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter,resolve1
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
 from pdfminer.pdfpage import PDFPage
-import PyPDF2
 
 from io import StringIO
 import io
@@ -24,42 +23,122 @@ ssl._create_default_https_context = ssl._create_unverified_context
 
 def handler(signum, frame):
     print("Forever is over!")
-    return TimeoutError
+    raise TimeoutError
 
 signal.signal(signal.SIGALRM, handler)
 def remove_tags(url):
     html_page = requests.get(url,timeout=3)
-    soup = BeautifulSoup(html_page.content, "html.parser")
-    text = []
-    # for data in soup(['style', 'script']):
-    for data in soup.find_all('p'):
-        text.append(data.get_text())
-
-    for data in soup.find_all('article'):
-        text.append(data.get_text())
-
-    for data in soup.find_all('span'):
-        text.append(data.get_text())
-
-
-    return ' '.join(text)[:10000]
+    return html_to_text(html_page.content)
+
+charset_meta = re.compile(rb'''<meta[^>]+charset=["']?([\w.:-]+)''', re.IGNORECASE)
+
+
+class HtmlTextExtractor:
+    """Incremental text extractor for html, fed the page body chunk by chunk.
+
+    Collects the text inside <p>, <article> and <span> tags in document order,
+    once (the text of nested ones is not repeated), skipping scripts and styles.
+    feed() returns True once max_chars have been collected, so the caller can
+    stop downloading the page.
+    """
+
+    TEXT_TAGS = {'p', 'article', 'span'}
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self, max_chars=10000, encoding=None):
+        self.max_chars = max_chars
+        self.encoding = encoding
+        self._parser = None
+        self._head = b''
+        self._text = []
+        self._length = 0
+        self._depth = 0
+        self._skip = 0
+
+    # lxml parser target interface
+    def start(self, tag, attrib):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.TEXT_TAGS:
+            if self._depth == 0:
+                self._text.append(' ')
+            self._depth += 1
+
+    def end(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in self.TEXT_TAGS:
+            self._depth = max(self._depth - 1, 0)
+
+    def data(self, data):
+        if self._depth and not self._skip:
+            self._text.append(data)
+            self._length += len(data)
+
+    def close(self):
+        pass
+
+    def _open_parser(self):
+        # the http charset, else the page's own meta charset, else utf-8
+        encoding = self.encoding
+        if encoding is None:
+            match = charset_meta.search(self._head)
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            self._parser = etree.HTMLParser(target=self, encoding=encoding)
+        except LookupError:
+            self._parser = etree.HTMLParser(target=self, encoding='utf-8')
+
+    def done(self):
+        return self._length >= self.max_chars
+
+    def feed(self, chunk):
+        if self.done():
+            return True
+        if self._parser is None:
+            # hold back the start of the page until its meta charset can be seen
+            self._head += chunk
+            if len(self._head) < 2048:
+                return False
+            self._open_parser()
+            chunk, self._head = self._head, b''
+        self._parser.feed(chunk)
+
+        return self.done()
+
+    def text(self):
+        if self._parser is None:
+            self._open_parser()
+            self._parser.feed(self._head)
+        # flushes whatever the parser still holds back
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        return ''.join(self._text).strip()[:self.max_chars]
+
+
+def html_to_text(content, max_chars=10000, encoding=None):
+    # content is the body of an already downloaded html page
+    extractor = HtmlTextExtractor(max_chars, encoding)
+    for i in range(0, len(content), 1 << 16):
+        if extractor.feed(content[i:i + (1 << 16)]):
+            break
+
+    return extractor.text()
 
 def return_read_webpage(req):
     signal.alarm(5)
     try:
         return urlopen(req, timeout=2).read()
     except:
-        signal.alarm(0)
         return TimeoutError
+    finally:
+        # never leave the alarm armed to go off in unrelated code
+        signal.alarm(0)
 
 
 def convert_pdf_to_txt(path):
-    rsrcmgr = PDFResourceManager()
-    retstr = StringIO()
-    codec = 'utf-8'
-    laparams = LAParams()
-    device = TextConverter(rsrcmgr, retstr, laparams=laparams)
-
     # with open(path, 'rb') as fp:
     # fp=open(path, 'rb')
     # print("For path:",path)
@@ -70,60 +149,57 @@ def convert_pdf_to_txt(path):
     try:
         # webpage = return_read_webpage(req)
         webpage = urlopen(req, timeout=3).read()
-        # f = urllib.request.urlopen(path).read()
-        # print("using fp = io.BytesIO(webpage):")
-        # signal.alarm(0)
-        fp = io.BytesIO(webpage)
+    except TimeoutError:
+        return ""
+    except Exception as e:
+        print('here:',e)
+        return ""
 
-        read_pdf = PyPDF2.PdfFileReader(fp)
-        number_of_pages = read_pdf.getNumPages()
-        # print("number of pages:",number_of_pages)
-        if number_of_pages>20:
-            # print("Skipping this pdf as pages nos. >20")
-            return ""
+    return pdf_to_text(webpage)
 
-        # text=""
-        #
-        # for i in range(number_of_pages):
-        #     page = read_pdf.getPage(i)
-        #     page_content = page.extractText()
-        #     text+=page_content+" "
 
+def pdf_to_text(webpage, max_chars=10000, max_pages=20):
+    # webpage is the body of an already downloaded pdf, pages are only
+    # interpreted until max_chars of text have been extracted
+    rsrcmgr = PDFResourceManager()
+    retstr = StringIO()
+    laparams = LAParams()
+    device = TextConverter(rsrcmgr, retstr, laparams=laparams)
+
+    try:
+        fp = io.BytesIO(webpage)
         parser = PDFParser(fp)
         document = PDFDocument(parser)
+        if not document.is_extractable:
+            return ""
 
-        interpreter = PDFPageInterpreter(rsrcmgr, device)
-        password = ""
-        caching = True
-        pagenos = set()
-
-
-        for page in PDFPage.get_pages(fp, pagenos, password=password,caching=caching, check_extractable=True):
-            # print("reading page in pdf:")
+        # the page count is read from the page tree, no need for a second pdf library
+        number_of_pages = resolve1(resolve1(document.catalog['Pages'])['Count'])
+        if number_of_pages > max_pages:
+            # print("Skipping this pdf as pages nos. >20")
+            return ""
 
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in PDFPage.create_pages(document):
             interpreter.process_page(page)
+            if retstr.tell() >= max_chars:
+                break
 
-
-        # print("getting text from retstr.getvalue():")
         text = retstr.getvalue()
 
     except TimeoutError:
         # print("time limit exceeded so skipping the link")
-        device.close()
-        retstr.close()
-        # signal.alarm(0)
         return ""
 
     except Exception as e:
-        device.close()
-        retstr.close()
-        # signal.alarm(0)
         print('here:',e)
         return ""
 
-    device.close()
-    retstr.close()
-    return text[:10000]
+    finally:
+        device.close()
+        retstr.close()
+
+    return text[:max_chars]
 
 # testing by passing a url:
 
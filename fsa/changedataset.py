@@ -8,6 +8,7 @@ from tqdm import tqdm
 from rouge import Rouge
 from icecream import ic
 from collections import defaultdict
+from fileio import openFile, stripCompression
 
 
 def getFileNames(path):
@@ -39,7 +40,7 @@ def main(args):
         for fn in tqdm(fnames):
             fn_path = f'{ln_path}/{fn}'
 
-            f = open(fn_path)
+            f = openFile(fn_path)
             df = [json.loads(line, strict=False) for line in f.readlines()]
 
             redata = []
@@ -62,7 +63,7 @@ def main(args):
             if not os.path.exists(f'{output_path}/{ln}'):
                 os.mkdir(f'{output_path}/{ln}')
 
-            writeFile(redata, f'{output_path}/{ln}/{fn}')
+            writeFile(redata, f'{output_path}/{ln}/{stripCompression(fn)}')
 
 if __name__ == "__main__":
 
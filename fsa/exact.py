@@ -5,6 +5,7 @@ import os
 from tqdm import tqdm
 import pandas as pd
 from collections import defaultdict
+from fileio import openFile
 
 def main(args):
 
@@ -26,7 +27,7 @@ def main(args):
         for dm in temp_dict[ln].keys():
             fsa_dict[ln][dom_dict[dm]] = temp_dict[ln][dm]
 
-    fp = open(data_path, 'r')
+    fp = openFile(data_path)
     df = [json.loads(line, strict=False) for line in fp.readlines()]
 
     rall = defaultdict(lambda: defaultdict(list))
@@ -0,0 +1,20 @@
+import io
+import gzip
+
+
+def openFile(path):
+    # scraped jsonl may be gzip (.gz) or zstd (.zst) compressed, as many frames back to back
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    if path.endswith('.zst'):
+        import zstandard  # optional, only needed for .zst files
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        return io.TextIOWrapper(reader)
+    return open(path)
+
+
+def stripCompression(fname):
+    for ext in ['.gz', '.zst']:
+        if fname.endswith(ext):
+            return fname[:-len(ext)]
+    return fname
@@ -11,6 +11,7 @@ from icecream import ic
 from collections import defaultdict
 from sacrebleu.metrics import BLEU
 import sacrebleu
+from fileio import openFile, stripCompression
 
 chrf = evaluate.load('chrf')
 meteor = evaluate.load('meteor')
@@ -254,20 +255,22 @@ def main(args):
                     if 'train' not in dom_path:
                         continue
 
-                    dom = dom[:-11]
+                    # a compressed train split comes with compressed val/test splits
+                    ext = dom[len(stripCompression(dom)):]
+                    dom = stripCompression(dom)[:-11]
 
                     # getting main dataset for lang/dom pair
-                    f = open(dom_path)
+                    f = openFile(dom_path)
                     df = [json.loads(line, strict=False) for line in f.readlines()]
 
                     # constructing adjacency matrix for given dataset
                     matrix = getMatrix(df, word_level)
 
 
-                    val_path = f'{ln_path}/{dom}_{sep}.json'
+                    val_path = f'{ln_path}/{dom}_{sep}.json{ext}'
 
                     # getting main dataset for lang/dom pair
-                    f = open(val_path)
+                    f = openFile(val_path)
                     df = [json.loads(line, strict=False) for line in f.readlines()]
 
                     refs = []
@@ -8,6 +8,7 @@ from tqdm import tqdm
 from icecream import ic
 from collections import defaultdict
 import matplotlib.pyplot as plt
+from fileio import openFile, stripCompression
 
 def getFileNames(path):
     fnames = [f for f in os.listdir(path)]
@@ -15,7 +16,7 @@ def getFileNames(path):
 
 def getFileData(path):
     data = []
-    with open(path) as f:
+    with openFile(path) as f:
         try:
             for line in f:
                 data.append(json.loads(line))
@@ -38,6 +39,7 @@ def main(args):
         for dom in tqdm(dom_names, desc='domains'):
             templist = []
             dom_path = f'{ln_path}/{dom}'
+            dom = stripCompression(dom)
 
             if 'train' in dom_path:
                 dom = dom[:-11]
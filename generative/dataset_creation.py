@@ -8,6 +8,7 @@ from rouge import Rouge
 from icecream import ic
 from random import shuffle
 from collections import defaultdict
+from fileio import openFile, stripCompression
 
 def getFileNames(path):
     fnames = [f for f in os.listdir(path)]
@@ -15,7 +16,7 @@ def getFileNames(path):
 
 def getFileData(path):
     data = []
-    with open(path) as f:
+    with openFile(path) as f:
         try:
             for line in f:
                 data.append(json.loads(line))
@@ -46,7 +47,7 @@ def main(args):
 
         for dom in tqdm(dom_names, desc='domains'):
             dom_path = f'{ln_path}/{dom}'
-            dom = dom[3:-5]
+            dom = stripCompression(dom)[3:-5]
             dataset = getFileData(dom_path)
             xdataset = []
             for article in dataset:
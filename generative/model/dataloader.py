@@ -10,10 +10,11 @@ from transformers import AutoTokenizer
 import pandas as pd
 import json
 import torch
+from fileio import openFile
 
 class Dataset1(Dataset):
     def __init__(self, data_path, tokenizer, max_source_length, max_target_length, is_mt5):
-        fp = open(data_path, 'r')
+        fp = openFile(data_path)
         self.df = [json.loads(line, strict=False) for line in fp.readlines()]
         self.tokenizer = tokenizer
         self.max_source_length = max_source_length